@@ -12,6 +12,7 @@ touch -a /games/log/django.log
 cd /games/src/website
 
 ./manage.py migrate --no-input
+./manage.py createcachetable
 
 chown --recursive www-data:www-data /games/
 
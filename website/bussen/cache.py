@@ -0,0 +1,137 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class GameStateCache:
+    """
+    Process-local cache of live BusGame objects.
+
+    Entries are keyed by game id and only hit when the requested state version matches the cached version. The cache
+    hands out copies so that model instances never share mutable game objects.
+    """
+
+    REPORT_INTERVAL = 1000
+
+    def __init__(self, max_size: int = 256, ttl: float = 300):
+        """
+        Initialize a GameStateCache object.
+
+        :param max_size: the maximum amount of games to keep, 0 disables the cache
+        :param ttl: the amount of seconds an entry stays valid after it was last stored
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Check if this cache stores any games."""
+        return self.max_size > 0
+
+    def get(self, game_id, version):
+        """
+        Get a copy of a cached game.
+
+        :param game_id: the id of the game
+        :param version: the state version of the game
+        :return: a copy of the cached BusGame or None if there is no valid entry for this version
+        """
+        if not self.enabled or game_id is None:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(game_id)
+            if entry is not None and entry[0] == version and entry[1] > time.monotonic():
+                self._entries.move_to_end(game_id)
+                self.hits += 1
+                game = entry[2]
+            else:
+                if entry is not None:
+                    del self._entries[game_id]
+                self.misses += 1
+                game = None
+            lookups = self.hits + self.misses
+
+        if lookups % self.REPORT_INTERVAL == 0:
+            logging.info("Game state cache: {}".format(self.stats()))
+
+        return game.copy() if game is not None else None
+
+    def set(self, game_id, version, game):
+        """
+        Store a copy of a game, replacing older versions of the same game.
+
+        :param game_id: the id of the game
+        :param version: the state version of the game
+        :param game: the BusGame object
+        :return: None
+        """
+        if not self.enabled or game_id is None:
+            return
+
+        entry = (version, time.monotonic() + self.ttl, game.copy())
+        with self._lock:
+            self._entries[game_id] = entry
+            self._entries.move_to_end(game_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def bump(self, game_id, version, new_version):
+        """
+        Move a cached game to a new version without altering the game itself.
+
+        :param game_id: the id of the game
+        :param version: the version the game is cached with
+        :param new_version: the new version of the game
+        :return: None
+        """
+        with self._lock:
+            entry = self._entries.get(game_id)
+            if entry is not None and entry[0] == version:
+                self._entries[game_id] = (new_version, time.monotonic() + self.ttl, entry[2])
+
+    def invalidate(self, game_id):
+        """
+        Remove a game from the cache.
+
+        :param game_id: the id of the game
+        :return: None
+        """
+        with self._lock:
+            self._entries.pop(game_id, None)
+
+    def clear(self):
+        """Remove all games from the cache."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Get the counters of this cache.
+
+        :return: a dictionary with the hits, misses, evictions, size and hit rate of this cache
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hit_rate": self.hits / lookups if lookups > 0 else 0.0,
+            }
+
+
+game_cache = GameStateCache(
+    max_size=getattr(settings, "BUSSEN_GAME_CACHE_SIZE", 256), ttl=getattr(settings, "BUSSEN_GAME_CACHE_TTL", 300),
+)
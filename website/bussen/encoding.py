@@ -0,0 +1,163 @@
+"""
+Compact game state format.
+
+A state is a base64 encoded byte string starting with a header containing the format version and a side table of
+player ids that own cards. Cards are encoded as a single byte holding the card number (0-51), a closed flag and an
+extended flag. Extended cards are followed by the index of their owner in the side table (0 for no owner) and their
+length-prefixed random identifier. Legacy states are JSON objects and always start with a curly bracket.
+"""
+import base64
+import struct
+
+STATE_FORMAT_VERSION = 3
+# Format versions that can be read, version 2 wrote an unused deck cursor after the deck size
+READABLE_STATE_FORMAT_VERSIONS = (2, STATE_FORMAT_VERSION)
+
+CARD_NUMBER_MASK = 0x3F
+CARD_CLOSED_FLAG = 0x40
+CARD_EXTENDED_FLAG = 0x80
+
+NONE_BYTE = 0xFF
+
+OWNER_ID_FORMAT = ">I"
+OWNER_ID_SIZE = struct.calcsize(OWNER_ID_FORMAT)
+
+
+class StateFormatException(Exception):
+    """Exception for states that can not be decoded."""
+
+    pass
+
+
+def is_legacy_state(state: str) -> bool:
+    """
+    Check if a state is stored in the legacy JSON format.
+
+    :param state: the state
+    :return: True if the state is a JSON object, False otherwise
+    """
+    return state.lstrip().startswith("{")
+
+
+class StateWriter:
+    """Writer for the compact state format."""
+
+    def __init__(self):
+        """Initialize a StateWriter object."""
+        self.buffer = bytearray()
+        self.owner_ids = list()
+        self._owner_indices = dict()
+
+    def write_byte(self, value: int):
+        """Write a single byte."""
+        self.buffer.append(value)
+
+    def write_optional_byte(self, value):
+        """Write a single byte that may be None."""
+        self.buffer.append(NONE_BYTE if value is None else value)
+
+    def write_bytes(self, value: bytes):
+        """Write a byte string prefixed with its length."""
+        self.buffer.append(len(value))
+        self.buffer.extend(value)
+
+    def write_card(self, number: int, closed: bool, owner_id, random_id):
+        """
+        Write a card.
+
+        :param number: the card number (0-51)
+        :param closed: whether or not the card is closed
+        :param owner_id: the id of the owner of the card or None
+        :param random_id: the hexadecimal random identifier of the card or None
+        :return: None
+        """
+        value = number
+        if closed:
+            value |= CARD_CLOSED_FLAG
+        if owner_id is None and random_id is None:
+            self.buffer.append(value)
+            return
+
+        self.buffer.append(value | CARD_EXTENDED_FLAG)
+        self.buffer.append(self._owner_index(owner_id))
+        self.write_bytes(b"" if random_id is None else bytes.fromhex(random_id))
+
+    def _owner_index(self, owner_id) -> int:
+        """Get the index of an owner in the side table, 0 is used for cards without an owner."""
+        if owner_id is None:
+            return 0
+        if owner_id not in self._owner_indices:
+            self.owner_ids.append(owner_id)
+            self._owner_indices[owner_id] = len(self.owner_ids)
+        return self._owner_indices[owner_id]
+
+    def to_bytes(self) -> bytes:
+        """Get the encoded state including the header."""
+        header = bytearray((STATE_FORMAT_VERSION, len(self.owner_ids)))
+        for owner_id in self.owner_ids:
+            header.extend(struct.pack(OWNER_ID_FORMAT, owner_id))
+        return bytes(header + self.buffer)
+
+    def to_state(self) -> str:
+        """Get the encoded state as text."""
+        return base64.b64encode(self.to_bytes()).decode("ascii")
+
+
+class StateReader:
+    """Reader for the compact state format."""
+
+    def __init__(self, state):
+        """
+        Initialize a StateReader object.
+
+        :param state: the encoded state, either as text or as bytes
+        """
+        try:
+            self.buffer = base64.b64decode(state) if isinstance(state, str) else bytes(state)
+            self.version = self.buffer[0]
+            if self.version not in READABLE_STATE_FORMAT_VERSIONS:
+                raise StateFormatException("Unsupported state format version {}".format(self.version))
+            owner_count = self.buffer[1]
+            self.position = 2
+            self.owner_ids = list()
+            for _ in range(owner_count):
+                self.owner_ids.append(struct.unpack_from(OWNER_ID_FORMAT, self.buffer, self.position)[0])
+                self.position += OWNER_ID_SIZE
+        except (ValueError, IndexError, struct.error) as e:
+            raise StateFormatException("Invalid state: {}".format(e))
+        self.players = dict()
+
+    def read_byte(self) -> int:
+        """Read a single byte."""
+        value = self.buffer[self.position]
+        self.position += 1
+        return value
+
+    def read_optional_byte(self):
+        """Read a single byte that may be None."""
+        value = self.read_byte()
+        return None if value == NONE_BYTE else value
+
+    def read_bytes(self) -> bytes:
+        """Read a byte string prefixed with its length."""
+        length = self.read_byte()
+        value = self.buffer[self.position : self.position + length]  # noqa
+        self.position += length
+        return value
+
+    def read_card(self):
+        """
+        Read a card.
+
+        :return: a tuple (number, closed, owner, random_id) where owner is resolved through the players attribute
+        """
+        value = self.read_byte()
+        number = value & CARD_NUMBER_MASK
+        closed = bool(value & CARD_CLOSED_FLAG)
+        if not value & CARD_EXTENDED_FLAG:
+            return number, closed, None, None
+
+        owner_index = self.read_byte()
+        owner = self.players.get(self.owner_ids[owner_index - 1]) if owner_index > 0 else None
+        random_id = self.read_bytes()
+        return number, closed, owner, random_id.hex() if len(random_id) > 0 else None
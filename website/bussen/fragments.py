@@ -0,0 +1,77 @@
+"""
+Fragments of the game pages pushed to players over the websocket.
+
+Fragments are keyed by the id of the container they replace. Shared fragments are rendered once for all players in a
+room, player fragments are only rendered for players that see something different and override the shared ones.
+"""
+from django.template.loader import get_template
+
+from .templatetags.game import (
+    render_game_cards,
+    render_player_question,
+    render_pyramid,
+    render_player_hand,
+    render_pyramid_header,
+    render_bus,
+)
+
+
+def render_fragment(template_name, context) -> str:
+    """
+    Render the content of a fragment container.
+
+    :param template_name: the name of the template of the fragment
+    :param context: the context for the template, rendered with refresh set to True
+    :return: the rendered html
+    """
+    return get_template(template_name).render(context)
+
+
+def render_shared_fragments(game) -> dict:
+    """
+    Render the fragments that are the same for all players in a game.
+
+    :param game: the BusGameModel to render the fragments of
+    :return: a dictionary mapping container ids to html
+    """
+    room = game.room
+    fragments = dict()
+    if game.phase in (game.PHASE_1, game.PHASE_2):
+        # Players still on the phase 1 page are shown that the round has ended
+        fragments["question-container"] = render_fragment(
+            "bussen/player_question.html", render_player_question({}, None, refresh=True, room=room)
+        )
+    if game.phase == game.PHASE_2:
+        fragments["pyramid-header-container"] = render_fragment(
+            "bussen/pyramid_header.html", render_pyramid_header({}, None, refresh=True, room=room)
+        )
+    elif game.phase == game.PHASE_3:
+        fragments["bus-container"] = render_fragment("bussen/bus.html", render_bus({}, None, refresh=True, room=room))
+    return fragments
+
+
+def render_player_fragments(game, player) -> dict:
+    """
+    Render the fragments that differ per player in a game.
+
+    :param game: the BusGameModel to render the fragments of
+    :param player: the Player to render the fragments for
+    :return: a dictionary mapping container ids to html, overriding the shared fragments
+    """
+    fragments = dict()
+    if game.phase == game.PHASE_1:
+        fragments["card-container"] = render_fragment(
+            "bussen/player_cards.html", render_game_cards({}, player, refresh=True)
+        )
+        if player == game.current_player:
+            fragments["question-container"] = render_fragment(
+                "bussen/player_question.html", render_player_question({}, player, refresh=True)
+            )
+    elif game.phase == game.PHASE_2:
+        fragments["pyramid-container"] = render_fragment(
+            "bussen/pyramid.html", render_pyramid({}, player, refresh=True)
+        )
+        fragments["hand-container"] = render_fragment("bussen/hand.html", render_player_hand({}, player, refresh=True))
+    elif game.phase == game.PHASE_3 and player == game.current_player:
+        fragments["bus-container"] = render_fragment("bussen/bus.html", render_bus({}, player, refresh=True))
+    return fragments
@@ -0,0 +1,525 @@
+"""
+Load test for rooms and bussen games.
+
+Simulated players create and join rooms through the views, play complete games over websockets connected to the ASGI
+application of this process and do the requests a browser does after a broadcast. The time between an action and the
+arrival of its first broadcast is measured for every player in the room.
+"""
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from rooms.models import Player, Room
+from rooms.tokens import read_token
+from .models import BusGameModel
+from .services import BusGame
+
+CHANNEL_LAYERS = ["memory", "settings"]
+REFRESH_MODES = ["on-demand", "always"]
+
+# Interval in seconds at which sockets are polled for broadcasts, the resolution of the measured latencies
+POLL_INTERVAL = 0.001
+
+MAXIMUM_ACTIONS_PER_GAME = 1000
+
+REFRESH_VIEWS = {
+    None: ["rooms:room_refresh"],
+    BusGameModel.PHASE_1: ["bussen:game_player_cards", "bussen:game_player_question"],
+    BusGameModel.PHASE_2: ["bussen:game_pyramid", "bussen:game_player_hand", "bussen:game_pyramid_header"],
+    BusGameModel.PHASE_3: ["bussen:game_bus"],
+}
+
+
+def percentile(values: [float], percent: float) -> float:
+    """
+    Get a percentile of a list of values with the nearest rank method.
+
+    :param values: the values
+    :param percent: the percentile, between 0 and 100
+    :return: the value at the percentile, None if there are no values
+    """
+    if len(values) == 0:
+        return None
+    values = sorted(values)
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+class LoadTestStatistics:
+    """Latencies, request durations and errors collected during a load test."""
+
+    def __init__(self):
+        """Initialize a LoadTestStatistics object."""
+        self.latencies = dict()
+        self.requests = dict()
+        self.errors = dict()
+        self.expected_broadcasts = 0
+        self.connections = 0
+
+    def add_latency(self, action: str, seconds: float):
+        """Register the time between an action and the arrival of its first broadcast at a player."""
+        self.latencies.setdefault(action, list()).append(seconds)
+
+    def add_request(self, endpoint: str, seconds: float, error: bool = False):
+        """Register the duration of a request to an endpoint."""
+        self.requests.setdefault(endpoint, list()).append(seconds)
+        if error:
+            self.add_error("http")
+
+    def add_error(self, kind: str):
+        """Register an error."""
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    @staticmethod
+    def summarize(durations: [float]) -> dict:
+        """Summarize a list of durations in seconds in milliseconds."""
+        return {
+            "count": len(durations),
+            "p50": percentile(durations, 50) * 1000,
+            "p95": percentile(durations, 95) * 1000,
+            "p99": percentile(durations, 99) * 1000,
+            "max": max(durations) * 1000,
+        }
+
+    def summary(self) -> dict:
+        """
+        Summarize the statistics.
+
+        :return: a dictionary with per action the latency percentiles, per endpoint the request duration percentiles,
+        the errors per kind and the error rate over all expected broadcasts, requests and connections
+        """
+        operations = self.expected_broadcasts + self.connections + sum(len(x) for x in self.requests.values())
+        return {
+            "latencies": {action: self.summarize(x) for action, x in sorted(self.latencies.items())},
+            "requests": {endpoint: self.summarize(x) for endpoint, x in sorted(self.requests.items())},
+            "errors": dict(self.errors),
+            "error_rate": sum(self.errors.values()) / operations if operations > 0 else 0,
+        }
+
+
+class LoadTestPlayer:
+    """A simulated browser of a player, with its own cookies and websocket."""
+
+    def __init__(self, name: str, statistics: LoadTestStatistics):
+        """
+        Initialize a LoadTestPlayer object.
+
+        :param name: the name of the player
+        :param statistics: the statistics to register requests and errors in
+        """
+        self.name = name
+        self.statistics = statistics
+        self.client = Client(raise_request_exception=False)
+        self.id = None
+        self.socket = None
+
+    async def request(self, method: str, url: str, endpoint: str, data: dict = None):
+        """
+        Do a request and register its duration.
+
+        :param method: "get" or "post"
+        :param url: the url to request
+        :param endpoint: the name to register the duration of the request under
+        :param data: the data to send
+        :return: the response
+        """
+        start = time.perf_counter()
+        response = await sync_to_async(getattr(self.client, method))(url, data if data is not None else {})
+        error = response.status_code >= 400
+        if not error and response.get("Content-Type") == "application/json":
+            error = json.loads(response.content).get("error", False) is True
+        self.statistics.add_request(endpoint, time.perf_counter() - start, error=error)
+        return response
+
+    async def create(self):
+        """Create this player with the create user view."""
+        await self.request("post", reverse("rooms:create_user"), "rooms:create_user", {"player_name": self.name})
+        self.id = read_token(self.client.cookies[Player.PLAYER_COOKIE_NAME].value)
+
+    async def connect(self, application, slug: str) -> bool:
+        """
+        Connect the websocket of this player to a room.
+
+        :param application: the ASGI application handling websockets
+        :param slug: the slug of the room
+        :return: True if the connection was accepted, False otherwise
+        """
+        self.statistics.connections += 1
+        cookie = "{}={}".format(Player.PLAYER_COOKIE_NAME, self.client.cookies[Player.PLAYER_COOKIE_NAME].value)
+        self.socket = WebsocketCommunicator(
+            application, "/rooms/{}/".format(slug), headers=[(b"cookie", cookie.encode())]
+        )
+        try:
+            connected, _ = await self.socket.connect()
+        except Exception:
+            logging.exception("Websocket of load test player {} failed to connect".format(self.name))
+            connected = False
+        if not connected:
+            self.statistics.add_error("connect")
+            self.socket = None
+        return connected
+
+    async def send(self, message: dict):
+        """Send a message over the websocket."""
+        await self.socket.send_to(text_data=json.dumps(message))
+
+    async def receive(self, timeout: float, settle: float):
+        """
+        Receive the broadcasts of an action.
+
+        :param timeout: the maximum time in seconds to wait for the first broadcast
+        :param settle: the time in seconds without messages after which all broadcasts of the action are received
+        :return: a tuple (the time the first broadcast arrived as returned by time.perf_counter or None if nothing was
+        received, the decoded messages)
+        """
+        first = None
+        messages = list()
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = settle if first is not None else deadline - time.monotonic()
+            if await self.socket.receive_nothing(timeout=max(wait, 0), interval=POLL_INTERVAL):
+                break
+            text = await self.socket.receive_from()
+            if first is None:
+                first = time.perf_counter()
+            messages.append(json.loads(text))
+        return first, messages
+
+    async def disconnect(self):
+        """Disconnect the websocket of this player."""
+        if self.socket is not None:
+            try:
+                await self.socket.disconnect()
+            except asyncio.CancelledError:
+                pass
+            self.socket = None
+
+
+class LoadTestRoom:
+    """A room of simulated players that play games of bussen."""
+
+    def __init__(self, name: str, players: [LoadTestPlayer], statistics: LoadTestStatistics, options: dict):
+        """
+        Initialize a LoadTestRoom object.
+
+        :param name: the name of the room
+        :param players: the players of the room, the first player creates the room and starts the games
+        :param statistics: the statistics to register latencies and errors in
+        :param options: a dictionary with the timeout and settle time in seconds, the refresh mode, the think time in
+        seconds between actions and a random.Random object to make choices with
+        """
+        self.name = name
+        self.players = players
+        self.statistics = statistics
+        self.options = options
+        self.random = options["random"]
+        self.room = None
+        self.phase = None
+        self.pyramid_index = None
+        self.placements = list()
+        self.called = False
+
+    async def setup(self, application) -> bool:
+        """
+        Create the players and the room, let the players join and connect their websockets.
+
+        :param application: the ASGI application handling websockets
+        :return: True if all players joined and connected, False otherwise
+        """
+        for player in self.players:
+            await player.create()
+        owner = self.players[0]
+        await owner.request("post", reverse("rooms:create_room"), "rooms:create_room", {"room_name": self.name})
+        self.room = await self.get_room()
+        if self.room is None:
+            self.statistics.add_error("setup")
+            return False
+        for player in self.players[1:]:
+            await player.request("get", reverse("rooms:join_room", kwargs={"room": self.room}), "rooms:join_room")
+        for player in self.players:
+            if not await player.connect(application, self.room.slug):
+                return False
+        settle = self.options["settle"]
+        await asyncio.gather(*[player.receive(settle, settle) for player in self.players])
+        return True
+
+    async def play(self, games: int):
+        """
+        Play games in this room.
+
+        :param games: the amount of games to play
+        :return: None
+        """
+        for _ in range(games):
+            url = reverse("rooms:start_game", kwargs={"room": self.room})
+            await self.action(
+                "room/start_game", self.players[0].request, "post", url, "rooms:start_game", {"game": "Bussen"}
+            )
+            for _ in range(MAXIMUM_ACTIONS_PER_GAME):
+                state = await self.get_state()
+                if state is None:
+                    break
+                self.phase = state["phase"]
+                if not await self.next_action(state):
+                    self.statistics.add_error("stalled")
+                    return
+                await asyncio.sleep(self.options["think_time"])
+            else:
+                self.statistics.add_error("stalled")
+                return
+            self.phase = None
+
+    async def next_action(self, state: dict) -> bool:
+        """
+        Do the next action in a game like players do.
+
+        :param state: the state of the game as returned by get_state
+        :return: False if there was no action to do, True otherwise
+        """
+        players = {player.id: player for player in self.players}
+        if state["phase"] == BusGameModel.PHASE_1:
+            hand = state["hands"][state["current_player"]]
+            question = BusGame.get_question_round_question(len(hand))
+            value = self.random.choice(question["answers"])["value"]
+            message = {"game": True, "phase": "phase1", "type": "answer", "value": value}
+            await self.send_action("phase1/answer", players[state["current_player"]], message)
+        elif state["phase"] == BusGameModel.PHASE_2:
+            if state["pyramid_index"] != self.pyramid_index:
+                self.start_pyramid_card(state)
+            if len(self.placements) > 0:
+                player_id, suit, rank = self.placements.pop(0)
+                message = {"game": True, "phase": "phase2", "type": "card", "suit": suit, "rank": rank}
+                await self.send_action("phase2/card", players[player_id], message)
+            elif not self.called and len(state["placed"]) > 0:
+                self.called = True
+                message = {"game": True, "phase": "phase2", "type": "call", "id": self.random.choice(state["placed"])}
+                await self.send_action("phase2/call", self.random.choice(self.players), message)
+            else:
+                message = {"game": True, "phase": "phase2", "type": "next_card", "index": state["pyramid_index"]}
+                await self.send_action("phase2/next_card", self.players[0], message)
+        elif state["phase"] == BusGameModel.PHASE_3:
+            guess = self.random.choice(["higher", "lower"])
+            message = {"game": True, "phase": "phase3", "type": "guess", "guess": guess, "index": state["bus_index"]}
+            await self.send_action("phase3/guess", players[state["current_player"]], message)
+        else:
+            return False
+        return True
+
+    def start_pyramid_card(self, state: dict):
+        """
+        Decide which cards the players place on a new pyramid card and whether a placed card is called.
+
+        Players place all cards of the rank of the pyramid card and sometimes a card of another rank.
+        :param state: the state of the game as returned by get_state
+        :return: None
+        """
+        self.pyramid_index = state["pyramid_index"]
+        self.placements = list()
+        if state["pyramid_rank"] is not None:
+            for player_id, hand in state["hands"].items():
+                for suit, rank in hand:
+                    if rank == state["pyramid_rank"] or self.random.random() < self.options["bluff_chance"]:
+                        self.placements.append((player_id, suit, rank))
+        self.called = self.random.random() >= self.options["call_chance"]
+
+    async def send_action(self, action: str, player: LoadTestPlayer, message: dict):
+        """Send a message over the websocket of a player as an action."""
+        await self.action(action, player.send, message)
+
+    async def action(self, action: str, function, *args):
+        """
+        Do an action and wait for its broadcasts at all players in the room.
+
+        :param action: the name to register the latencies of the action under
+        :param function: the coroutine function doing the action
+        :param args: the arguments of the function
+        :return: None
+        """
+        for player in self.players:
+            # Late broadcasts of the previous action would be taken for the broadcasts of this action
+            _, messages = await player.receive(0, 0)
+            await self.handle_messages(player, messages)
+        start = time.perf_counter()
+        await function(*args)
+        results = await asyncio.gather(
+            *[player.receive(self.options["timeout"], self.options["settle"]) for player in self.players]
+        )
+        self.statistics.expected_broadcasts += len(self.players)
+        for player, (first, messages) in zip(self.players, results):
+            if first is None:
+                self.statistics.add_error("timeout")
+            else:
+                self.statistics.add_latency(action, first - start)
+                await self.handle_messages(player, messages)
+
+    async def handle_messages(self, player: LoadTestPlayer, messages: [dict]):
+        """Do the requests a browser does after receiving messages, a redirect loads a page instead of refreshing."""
+        refresh = self.options["refresh"] == "always" and len(messages) > 0
+        for message in messages:
+            if message.get("type") == "refresh":
+                refresh = True
+            elif message.get("type") in ("redirect", "celebrate"):
+                response = await player.request("get", message["url"], "redirect")
+                if response.status_code == 302:
+                    await player.request("get", response.url, "page")
+                return
+        if refresh:
+            phase = self.phase if self.phase in REFRESH_VIEWS.keys() else None
+            for view in REFRESH_VIEWS[phase]:
+                await player.request("post", reverse(view, kwargs={"room": self.room}), view)
+
+    @database_sync_to_async
+    def get_room(self):
+        """Get the room created by the first player."""
+        return Room.objects.filter(name=self.name).only("id", "slug").first()
+
+    @database_sync_to_async
+    def get_state(self):
+        """
+        Get the state of the game of this room as players see it.
+
+        :return: a dictionary with the phase and depending on the phase the id of the current player, the hands of the
+        players, the index, rank and placed cards of the current pyramid card or the bus index, None if the room has no
+        game
+        """
+        room = Room.objects.get(pk=self.room.id)
+        game = room.game
+        if game is None:
+            return None
+        state = {"phase": game.phase}
+        if game.current_player_index is not None:
+            state["current_player"] = room.players[game.current_player_index].id
+        if game.phase in (BusGameModel.PHASE_1, BusGameModel.PHASE_2):
+            state["hands"] = {
+                player_id: [(card.suit, card.rank) for card in hand.card_list]
+                for player_id, hand in game.get_hands().items()
+            }
+        if game.phase == BusGameModel.PHASE_2:
+            pyramid_card = game.game.pyramid.current_card()
+            state["pyramid_index"] = game.game.pyramid.current_card_index
+            state["pyramid_rank"] = pyramid_card.rank if pyramid_card is not None else None
+            state["placed"] = [card.random_id for card in game.game.pyramid.cards_on_pyramid]
+        elif game.phase == BusGameModel.PHASE_3:
+            state["bus_index"] = game.game.bus.current_card_index
+        return state
+
+    async def disconnect(self):
+        """Disconnect the websockets of all players."""
+        for player in self.players:
+            await player.disconnect()
+
+    @database_sync_to_async
+    def cleanup(self):
+        """Remove the room, its game and the players of this room."""
+        Player.objects.filter(id__in=[player.id for player in self.players if player.id is not None]).delete()
+        if self.room is not None:
+            room = Room.objects.filter(pk=self.room.id).first()
+            if room is not None and room.game is not None:
+                room.game.delete()
+            Room.objects.filter(pk=self.room.id).delete()
+
+
+async def run_rooms(application, rooms: int, players: int, games: int, options: dict, keep: bool = False) -> dict:
+    """
+    Let rooms of players play games concurrently.
+
+    :param application: the ASGI application handling websockets
+    :param rooms: the amount of rooms
+    :param players: the amount of players per room
+    :param games: the amount of games played in each room
+    :param options: the options of the rooms, see LoadTestRoom
+    :param keep: keep the rooms and players instead of removing them afterwards
+    :return: the summary of the statistics with the amount of rooms that completed all games and the duration
+    """
+    statistics = LoadTestStatistics()
+    # Room names only consist of word characters as the slug of a room has to match the websocket route
+    prefix = "loadtest{}".format(uuid.uuid4().hex[:8])
+    load_test_rooms = [
+        LoadTestRoom(
+            "{}r{}".format(prefix, room),
+            [LoadTestPlayer("loadtest r{}p{}".format(room, player), statistics) for player in range(players)],
+            statistics,
+            options,
+        )
+        for room in range(rooms)
+    ]
+
+    async def run_room(room):
+        try:
+            if await room.setup(application):
+                await room.play(games)
+                return True
+        except Exception:
+            logging.exception("Load test room {} failed".format(room.name))
+            statistics.add_error("exception")
+        finally:
+            await room.disconnect()
+            if not keep:
+                await room.cleanup()
+        return False
+
+    start = time.perf_counter()
+    completed = await asyncio.gather(*[run_room(room) for room in load_test_rooms])
+    summary = statistics.summary()
+    summary["rooms"] = rooms
+    summary["completed"] = sum(completed)
+    summary["seconds"] = time.perf_counter() - start
+    return summary
+
+
+def run_load_test(
+    rooms: int,
+    players: int,
+    games: int = 1,
+    channel_layer: str = "memory",
+    refresh: str = "on-demand",
+    timeout: float = 5,
+    settle: float = 0.2,
+    think_time: float = 0,
+    seed: int = None,
+    keep: bool = False,
+) -> dict:
+    """
+    Run a load test.
+
+    :param rooms: the amount of rooms
+    :param players: the amount of players per room
+    :param games: the amount of games played in each room
+    :param channel_layer: "memory" for the in-memory channel layer, "settings" for the channel layer in the settings
+    :param refresh: "on-demand" to request the refresh views after a refresh message, "always" after every broadcast
+    :param timeout: the maximum time in seconds to wait for a broadcast
+    :param settle: the time in seconds without messages after which all broadcasts of an action are received
+    :param think_time: the time in seconds between the actions in a room
+    :param seed: the seed for the choices of the players
+    :param keep: keep the rooms and players instead of removing them afterwards
+    :return: a dictionary with the summary of the statistics, see LoadTestStatistics.summary
+    """
+    if channel_layer not in CHANNEL_LAYERS:
+        raise ValueError("The channel layer must be one of {}".format(", ".join(CHANNEL_LAYERS)))
+    if refresh not in REFRESH_MODES:
+        raise ValueError("The refresh mode must be one of {}".format(", ".join(REFRESH_MODES)))
+    options = {
+        "refresh": refresh,
+        "timeout": timeout,
+        "settle": settle,
+        "think_time": think_time,
+        "bluff_chance": 0.05,
+        "call_chance": 0.5,
+        "random": random.Random(seed),
+    }
+    from games.routing import application
+
+    if channel_layer == "memory":
+        with override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}):
+            return asyncio.run(run_rooms(application, rooms, players, games, options, keep=keep))
+    return asyncio.run(run_rooms(application, rooms, players, games, options, keep=keep))
@@ -0,0 +1,53 @@
+from django.core.management import BaseCommand
+
+from bussen.services import BusGame
+from bussen.simulator import STRATEGIES, run_benchmark
+
+
+class Command(BaseCommand):
+    """Command to measure the throughput of the game engine by playing simulated games without database."""
+
+    def add_arguments(self, parser):
+        """Arguments for the command."""
+        parser.add_argument("--games", type=int, dest="games", default=1000, help="Amount of games to play")
+        parser.add_argument(
+            "--players",
+            type=int,
+            dest="players",
+            default=4,
+            choices=range(2, BusGame.MAXIMUM_AMOUNT_OF_PLAYERS + 1),
+            help="Amount of players per game",
+        )
+        parser.add_argument(
+            "--strategy", dest="strategy", default="random", choices=STRATEGIES, help="Strategy of the players",
+        )
+        parser.add_argument("--seed", type=int, dest="seed", default=None, help="Seed to make the games reproducible")
+        parser.add_argument(
+            "--serialize",
+            action="store_true",
+            dest="serialize",
+            default=False,
+            help="Export and import the game and hands after every move",
+        )
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        result = run_benchmark(
+            options["games"],
+            options["players"],
+            strategy=options["strategy"],
+            seed=options["seed"],
+            serialize=options["serialize"],
+        )
+        self.stdout.write(
+            "Played {} games in {:.2f} seconds ({:.1f} games/sec)".format(
+                result["games"], result["seconds"], result["games_per_second"]
+            )
+        )
+        self.stdout.write("{:<20}{:>12}{:>14}{:>12}".format("operation", "calls", "total (ms)", "mean (us)"))
+        for operation, timing in sorted(result["operations"].items(), key=lambda x: x[1]["total"], reverse=True):
+            self.stdout.write(
+                "{:<20}{:>12}{:>14.1f}{:>12.2f}".format(
+                    operation, timing["count"], timing["total"] * 1000, timing["mean"] * 1000000
+                )
+            )
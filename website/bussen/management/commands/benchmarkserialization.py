@@ -0,0 +1,66 @@
+import json
+
+from django.core.management import BaseCommand
+
+from bussen.serialization_benchmark import FORMATS, compare, run_serialization_benchmark
+
+
+class Command(BaseCommand):
+    """Command to measure the time and memory of exporting and importing game states in every format."""
+
+    def add_arguments(self, parser):
+        """Arguments for the command."""
+        parser.add_argument(
+            "--iterations", type=int, dest="iterations", default=1000, help="Amount of measured calls per operation",
+        )
+        parser.add_argument(
+            "--format",
+            dest="formats",
+            action="append",
+            choices=FORMATS,
+            default=None,
+            help="Format to measure, can be given multiple times, defaults to all formats",
+        )
+        parser.add_argument("--seed", type=int, dest="seed", default=None, help="Seed for the decks of the states")
+        parser.add_argument(
+            "--output", dest="output", default=None, help="File to write the results to as JSON for later comparison",
+        )
+        parser.add_argument(
+            "--compare", dest="compare", default=None, help="File with earlier results to compare the results with",
+        )
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        results = run_serialization_benchmark(
+            iterations=options["iterations"], formats=options["formats"], seed=options["seed"]
+        )
+        if options["output"] is not None:
+            with open(options["output"], "w") as file:
+                json.dump(results, file, indent=2)
+        if options["compare"] is not None:
+            with open(options["compare"]) as file:
+                results = compare(results, json.load(file))
+
+        self.stdout.write(
+            "{:<18}{:<8}{:<8}{:>8}{:>12}{:>10}{:>10}{:>10}".format(
+                "fixture", "format", "op", "size", "mean (us)", "bytes", "time", "memory"
+            )
+        )
+        for result in results:
+            self.stdout.write(
+                "{:<18}{:<8}{:<8}{:>8}{:>12.2f}{:>10}{:>10}{:>10}".format(
+                    result["fixture"],
+                    result["format"],
+                    result["operation"],
+                    result["size"] if result["size"] is not None else "",
+                    result["seconds"] * 1000000,
+                    result["bytes"],
+                    self.format_change(result.get("seconds_change")),
+                    self.format_change(result.get("bytes_change")),
+                )
+            )
+
+    @staticmethod
+    def format_change(change):
+        """Format a relative change."""
+        return "{:+.1%}".format(change) if change is not None else ""
@@ -0,0 +1,60 @@
+from django.core.management import BaseCommand
+
+from bussen.models import BusGameModel, Hand
+from bussen.services import BusGame, BusHand
+
+
+class Command(BaseCommand):
+    """Command to convert stored game and hand states from the legacy JSON format to the compact state format."""
+
+    def add_arguments(self, parser):
+        """Arguments for the command."""
+        parser.add_argument(
+            "--batch-size", type=int, dest="batch-size", default=100, help="Amount of states converted per batch",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", dest="dry-run", default=False, help="Dry run instead of saving data",
+        )
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        for model, state_class in ((BusGameModel, BusGame), (Hand, BusHand)):
+            converted, size_before, size_after = self.convert_states(
+                model, state_class, options["batch-size"], options["dry-run"]
+            )
+            self.stdout.write(
+                "Converted {} {} states ({} bytes to {} bytes)".format(
+                    converted, model._meta.verbose_name, size_before, size_after
+                )
+            )
+
+    @staticmethod
+    def convert_states(model, state_class, batch_size, dry_run=False):
+        """
+        Convert legacy states of a model in batches.
+
+        States are only overwritten if they did not change while converting them.
+        :param model: the model class to convert the states of
+        :param state_class: the class to import and export the states with
+        :param batch_size: the amount of states to convert per batch
+        :param dry_run: does not really save states if True
+        :return: a tuple (amount of converted states, size before, size after)
+        """
+        converted = size_before = size_after = 0
+        last_id = 0
+        while True:
+            batch = list(
+                model.objects.filter(id__gt=last_id, state__startswith="{")
+                .order_by("id")
+                .values_list("id", "state")[:batch_size]
+            )
+            if len(batch) == 0:
+                break
+            for object_id, state in batch:
+                new_state = state_class.from_state(state).to_state()
+                if dry_run or model.objects.filter(id=object_id, state=state).update(state=new_state):
+                    converted += 1
+                    size_before += len(state)
+                    size_after += len(new_state)
+            last_id = batch[-1][0]
+        return converted, size_before, size_after
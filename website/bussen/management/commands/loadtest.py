@@ -0,0 +1,87 @@
+import json
+
+from django.core.management import BaseCommand
+
+from bussen.loadtest import CHANNEL_LAYERS, REFRESH_MODES, run_load_test
+
+
+class Command(BaseCommand):
+    """Command to load test rooms by letting simulated players play games of bussen over websockets."""
+
+    def add_arguments(self, parser):
+        """Arguments for the command."""
+        parser.add_argument("--rooms", type=int, dest="rooms", default=10, help="Amount of rooms")
+        parser.add_argument("--players", type=int, dest="players", default=4, help="Amount of players per room")
+        parser.add_argument("--games", type=int, dest="games", default=1, help="Amount of games played per room")
+        parser.add_argument(
+            "--channel-layer",
+            dest="channel-layer",
+            default="memory",
+            choices=CHANNEL_LAYERS,
+            help="Use the in-memory channel layer or the channel layer of the settings (for example a local Redis)",
+        )
+        parser.add_argument(
+            "--refresh",
+            dest="refresh",
+            default="on-demand",
+            choices=REFRESH_MODES,
+            help="Request the refresh views after refresh messages only or after every broadcast",
+        )
+        parser.add_argument(
+            "--timeout", type=float, dest="timeout", default=5, help="Seconds to wait for the broadcast of an action",
+        )
+        parser.add_argument(
+            "--settle",
+            type=float,
+            dest="settle",
+            default=0.2,
+            help="Seconds without messages after which all broadcasts of an action are received",
+        )
+        parser.add_argument(
+            "--think-time", type=float, dest="think-time", default=0, help="Seconds between the actions in a room",
+        )
+        parser.add_argument("--seed", type=int, dest="seed", default=None, help="Seed for the choices of players")
+        parser.add_argument(
+            "--keep", action="store_true", dest="keep", default=False, help="Keep the rooms and players afterwards",
+        )
+        parser.add_argument(
+            "--json", action="store_true", dest="json", default=False, help="Write the results as JSON",
+        )
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        result = run_load_test(
+            options["rooms"],
+            options["players"],
+            games=options["games"],
+            channel_layer=options["channel-layer"],
+            refresh=options["refresh"],
+            timeout=options["timeout"],
+            settle=options["settle"],
+            think_time=options["think-time"],
+            seed=options["seed"],
+            keep=options["keep"],
+        )
+        if options["json"]:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+
+        self.stdout.write(
+            "{} of {} rooms completed in {:.2f} seconds, error rate {:.2%} ({})".format(
+                result["completed"],
+                result["rooms"],
+                result["seconds"],
+                result["error_rate"],
+                ", ".join("{} {}".format(amount, kind) for kind, amount in result["errors"].items()) or "no errors",
+            )
+        )
+        for title, durations in (("action to broadcast", result["latencies"]), ("request", result["requests"])):
+            self.stdout.write(
+                "{:<32}{:>8}{:>10}{:>10}{:>10}{:>10}".format(title, "count", "p50 ms", "p95 ms", "p99 ms", "max ms")
+            )
+            for name, summary in durations.items():
+                self.stdout.write(
+                    "{:<32}{:>8}{:>10.1f}{:>10.1f}{:>10.1f}{:>10.1f}".format(
+                        name, summary["count"], summary["p50"], summary["p95"], summary["p99"], summary["max"]
+                    )
+                )
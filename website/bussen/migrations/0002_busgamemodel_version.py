@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-18 07:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bussen', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='busgamemodel',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
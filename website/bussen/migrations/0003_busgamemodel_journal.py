@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-18 07:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bussen', '0002_busgamemodel_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='busgamemodel',
+            name='journal',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
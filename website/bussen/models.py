@@ -1,9 +1,14 @@
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat
 from django.shortcuts import redirect
 
+from games.instrumentation import instrumentation
+from .cache import game_cache
 from .services import BusGame, BusHand, BusCard, BusGameConsumer
-from rooms.models import Player, Room, NoRoomForGameException
+from rooms.models import Player, Room, NoRoomForGameException, group_send, queue_group_events
 
 
 class GameStateException(Exception):
@@ -12,6 +17,12 @@ class GameStateException(Exception):
     pass
 
 
+class ConcurrentSaveException(GameStateException):
+    """Exception raised when a game is saved while another writer saved it since it was loaded."""
+
+    pass
+
+
 class BusGameModel(models.Model):
     """Game model."""
 
@@ -31,15 +42,32 @@ class BusGameModel(models.Model):
     state = models.TextField(null=True, default=None)
     phase = models.IntegerField(choices=PHASES, default=0, null=False, blank=False)
     current_player_index = models.IntegerField(null=True, blank=False, default=0)
+    version = models.PositiveIntegerField(default=0)
+    journal = models.TextField(blank=True, default="")
+
+    SNAPSHOT_INTERVAL = getattr(settings, "BUSSEN_SNAPSHOT_INTERVAL", 25)
+    # Amount of times an alteration is attempted when other writers keep saving the game first
+    SAVE_ATTEMPTS = 3
 
     @property
     def room(self) -> Room:
-        """Get the corresponding room for this game."""
-        ct = ContentType.objects.get_for_model(self)
-        try:
-            return Room.objects.get(content_type=ct, object_id=self.id)
-        except Room.DoesNotExist:
-            raise NoRoomForGameException
+        """Get the corresponding room for this game, the room is only looked up once per object."""
+        if self._room is None:
+            ct = ContentType.objects.get_for_model(self)
+            try:
+                self._room = Room.objects.get(content_type=ct, object_id=self.id)
+            except Room.DoesNotExist:
+                raise NoRoomForGameException
+        return self._room
+
+    def cache_room(self, room):
+        """
+        Cache the room of this game.
+
+        :param room: the Room this game belongs to, None to look up the room again on the next access
+        :return: None
+        """
+        self._room = room
 
     def remove_player(self, player):
         """
@@ -48,16 +76,19 @@ class BusGameModel(models.Model):
         :param player: the player to remove
         :return: this object or None if the object has been removed due to it being out of player bounds
         """
-        try:
-            Hand.objects.get(player=player, game=self).delete()
-        except Hand.DoesNotExist:
-            pass
+        return self.run_atomic(self._remove_player, player)
+
+    def _remove_player(self, player):
+        """Remove a player from this game, see remove_player."""
+        Hand.objects.filter(player=player, game=self).delete()
 
-        if player not in list(self.room.players)[self.current_player_index :]:  # noqa
+        position = self.room.player_position(player)
+        # There is no current player in phase 2
+        if self.current_player_index is not None and (position is None or position < self.current_player_index):
             self.current_player_index -= 1
             self.save()
 
-        if len(list(self.room.players)) - 1 < self.minimum_amount_of_players():
+        if len(self.room.players) - 1 < self.minimum_amount_of_players():
             self.delete()
             return None
         return self
@@ -66,17 +97,15 @@ class BusGameModel(models.Model):
         """
         Initialize BusGameModel object.
 
-        This initializes the _game property that holds the BusGame object. _original_state will also be initialized as
-        a way to see whether the game state was manually changed in the save method.
+        The BusGame object held in the _game property is only constructed when the game property is first accessed.
+        _original_state will be initialized as a way to see whether the game state was manually changed in the save
+        method.
         :param args: arguments
         :param kwargs: keyword arguments
         """
         super().__init__(*args, **kwargs)
-        if self.state is None:
-            self._game = BusGame()
-        else:
-            self._game = BusGame.from_json(self.state)
-
+        self._game = None
+        self._room = None
         self._original_state = self.state
 
     def __str__(self):
@@ -85,30 +114,180 @@ class BusGameModel(models.Model):
 
         :return: a string with the name of the game
         """
-        ct = ContentType.objects.get_for_model(self)
         try:
-            room = Room.objects.get(content_type=ct, object_id=self.id)
-            return "Bussen ({})".format(room.name)
-        except Room.DoesNotExist:
+            return "Bussen ({})".format(self.room.name)
+        except NoRoomForGameException:
             return "Bussen (No corresponding room)"
 
     def save(self, *args, **kwargs):
         """
         Save method for Game object.
 
+        Every save increases the state version. Alterations of the BusGame object are appended to the journal, a
+        full state is only written if the alterations can not be journaled or the journal has grown too long. The saved
+        game is written through to the game cache. Existing games are only written if the stored version still equals
+        the version of this object, the arguments are only used when a new game is inserted.
         :param args: arguments
         :param kwargs: keyword arguments
+        :raises ConcurrentSaveException: if another writer saved this game since it was loaded, reload it and apply the
+        alterations again (see run_atomic)
         :return: None
         """
         # Check if changes have been done to the state itself
-        if self._original_state == self.state:
-            self.state = self._game.to_json()
-            self._original_state = self.state
-        super(BusGameModel, self).save(*args, **kwargs)
+        state_changed = self._original_state != self.state
+        if not state_changed and self._save_journal():
+            return
+        if not state_changed and self.state is None:
+            # A new game must store its freshly shuffled deck
+            self.game
+        game_changed = not state_changed and self._game is not None and self._game.changed
+        state = self.state
+        if game_changed:
+            with instrumentation.timer("serialization"):
+                state = self._game.to_state()
+        journal = "" if game_changed or state_changed else self.journal
+
+        if self.pk is None:
+            self.state, self.journal = state, journal
+            self.version += 1
+            super(BusGameModel, self).save(*args, **kwargs)
+        else:
+            self._update(state=state, journal=journal)
+            self.state, self.journal = state, journal
+            self.version += 1
+        self._original_state = self.state
+        if game_changed:
+            self._game.clear_journal()
+
+        if state_changed:
+            self._game = None
+            game_cache.invalidate(self.id)
+        elif game_changed:
+            game_cache.set(self.id, self.version, self._game)
+        else:
+            game_cache.bump(self.id, self.version - 1, self.version)
+
+    def _update(self, **fields):
+        """
+        Write fields of this game if the stored version still equals the version of this object.
+
+        :param fields: the fields to write besides the phase, the current player and the next version
+        :raises ConcurrentSaveException: if the stored version differs
+        :return: None
+        """
+        fields.update(
+            {"version": self.version + 1, "phase": self.phase, "current_player_index": self.current_player_index}
+        )
+        if not BusGameModel.objects.filter(pk=self.pk, version=self.version).update(**fields):
+            raise ConcurrentSaveException(
+                "Game {} was saved by another writer since version {}".format(self.pk, self.version)
+            )
+
+    def _save_journal(self) -> bool:
+        """
+        Save this game by appending the operations in the journal of the BusGame object to the stored journal.
+
+        Only the journal and the non-state fields are written.
+        :raises ConcurrentSaveException: if another writer saved this game since it was loaded
+        :return: True if the game was saved, False if a full save is required
+        """
+        if self.pk is None or self.state is None:
+            return False
+        if self._game is not None and self._game.changed:
+            if self._game.requires_snapshot:
+                return False
+            if self.journal.count(BusGame.OPERATION_SEPARATOR) + len(self._game.journal) >= self.SNAPSHOT_INTERVAL:
+                return False
+            operations = self._game.journal_text
+        else:
+            operations = ""
+
+        if operations != "":
+            self._update(journal=Concat(F("journal"), Value(operations)))
+        else:
+            self._update()
+
+        if operations != "":
+            self._game.clear_journal()
+        self.journal += operations
+        self.version += 1
+        if self._game is not None and operations != "":
+            game_cache.set(self.id, self.version, self._game)
+        else:
+            game_cache.bump(self.id, self.version - 1, self.version)
+        return True
+
+    def reload(self):
+        """Load the stored fields of this game again, dropping the loaded BusGame object and unsaved alterations."""
+        self.refresh_from_db(fields=["state", "journal", "phase", "current_player_index", "version"])
+        self._game = None
+        self._original_state = self.state
+
+    def run_atomic(self, function, *args):
+        """
+        Run a function altering this game in a transaction.
+
+        If another writer saved this game first, the transaction is rolled back and the function is run again on the
+        reloaded game. Group events are queued and only sent when the transaction is committed, so events of a rolled
+        back attempt are dropped.
+        :param function: the function to run
+        :param args: the arguments of the function
+        :raises ConcurrentSaveException: if all SAVE_ATTEMPTS attempts failed
+        :return: the return value of the function, None if the game was deleted by another writer
+        """
+        for attempt in range(1, self.SAVE_ATTEMPTS + 1):
+            try:
+                with queue_group_events() as events, transaction.atomic():
+                    result = function(*args)
+            except ConcurrentSaveException:
+                # Cached versions written in the rolled back transaction are not stored
+                game_cache.invalidate(self.id)
+                if attempt == self.SAVE_ATTEMPTS:
+                    raise
+                try:
+                    self.reload()
+                except BusGameModel.DoesNotExist:
+                    return None
+            except Exception:
+                game_cache.invalidate(self.id)
+                raise
+            else:
+                for group, event in events:
+                    group_send(group, event)
+                return result
+
+    def delete(self, *args, **kwargs):
+        """
+        Delete method for Game object.
+
+        :param args: arguments
+        :param kwargs: keyword arguments
+        :return: the amount of deleted objects
+        """
+        game_cache.invalidate(self.id)
+        return super(BusGameModel, self).delete(*args, **kwargs)
 
     @property
     def game(self) -> BusGame:
-        """Get the current BusGame object."""
+        """
+        Get the current BusGame object, construct it from the game cache or the state if it is not loaded yet.
+
+        The owners of cached cards are looked up again, as players may have left or have been removed since the game
+        was cached.
+        """
+        if self._game is None:
+            if self.state is None:
+                self._game = BusGame()
+            else:
+                self._game = game_cache.get(self.id, self.version)
+                if self._game is not None:
+                    self._game.resolve_owners()
+                else:
+                    with instrumentation.timer("serialization"):
+                        self._game = BusGame.from_state(self.state)
+                        if self.journal:
+                            self._game.replay(self.journal)
+                    game_cache.set(self.id, self.version, self._game)
         return self._game
 
     def get_card(self, save=True) -> BusCard:
@@ -159,15 +338,11 @@ class BusGameModel(models.Model):
         self.phase = self.PHASE_3
         self.save()
 
-        player_lost = 0
-
-        for i in range(0, len(self.room.players)):
-            hand_player_lost = Hand.get_hand(self.room.players[player_lost], self)
-            hand_player = Hand.get_hand(self.room.players[i], self)
-            if len(hand_player_lost.hand.hand) < len(hand_player.hand.hand):
-                player_lost = i
+        players = self.room.players
+        hands = self.get_hands(players)
+        player_lost = BusGame.get_bus_player([len(hands[player.id].hand.hand) for player in players])
 
-        [Hand.get_hand(player, self).delete() for player in self.room.players]
+        self.delete_hands()
 
         self.current_player_index = player_lost
         self.game.reset_deck()
@@ -180,7 +355,7 @@ class BusGameModel(models.Model):
         if not self.cards_left or self.phase != self.PHASE_3 or self.current_player != player:
             return None
 
-        card = self.get_card()
+        card = self.get_card(save=False)
         correct = self.game.bus.guess_card(guess, card)
         self.phase3_next_turn(save=False)
         self.save()
@@ -188,7 +363,7 @@ class BusGameModel(models.Model):
 
     def phase3_next_turn(self, save=True):
         """Update phase 3 game state."""
-        if self.game.bus.current_card_index >= BusGame.BUS_CARD_AMOUNT or self.game.cards_left <= 0:
+        if self.game.bus_finished:
             self.phase = BusGameModel.PHASE_FINISHED
 
         if save:
@@ -210,7 +385,7 @@ class BusGameModel(models.Model):
 
         :return: the amount of players in this game
         """
-        return self.room.players.count()
+        return len(self.room.players)
 
     @property
     def amount_of_online_players(self) -> int:
@@ -219,7 +394,7 @@ class BusGameModel(models.Model):
 
         :return: the amount of online players in the game
         """
-        return self.room.players.filter(online=True).count()
+        return len([player for player in self.room.players if player.online])
 
     def get_amount_of_players(self) -> int:
         """
@@ -244,8 +419,9 @@ class BusGameModel(models.Model):
 
         :return: None if there is no current player, the Player object of the current player otherwise
         """
-        if self.current_player_index is not None and 0 <= self.current_player_index < self.amount_of_players:
-            return self.room.players[self.current_player_index]
+        players = self.room.players
+        if self.current_player_index is not None and 0 <= self.current_player_index < len(players):
+            return players[self.current_player_index]
 
         raise ValueError("Current player index is not within player list bounds.")
 
@@ -261,93 +437,86 @@ class BusGameModel(models.Model):
         hand = Hand.get_hand(player, self)
         return BusGame.get_question_round_question(len(hand.hand.hand))
 
-    def phase1_next_turn(self):
+    def get_hands(self, players=None) -> dict:
+        """
+        Get the hands of players in this game in one query, missing hands are created.
+
+        :param players: a list of players to get the hands of, defaults to all players in the room of this game
+        :return: a dictionary mapping player ids to Hand objects
+        """
+        if players is None:
+            players = self.room.players
+        hands = {hand.player_id: hand for hand in Hand.objects.filter(game=self, player__in=players)}
+        missing = [player for player in players if player.id not in hands]
+        if len(missing) > 0:
+            Hand.objects.bulk_create([Hand(player=player, game=self) for player in missing])
+            hands.update({hand.player_id: hand for hand in Hand.objects.filter(game=self, player__in=missing)})
+        return hands
+
+    @staticmethod
+    def save_hands(hands):
+        """
+        Save altered hands in one query.
+
+        :param hands: an iterable of Hand objects
+        :return: None
+        """
+        altered = [hand for hand in hands if hand.update_state()]
+        if len(altered) > 0:
+            Hand.objects.bulk_update(altered, ["state"])
+
+    def delete_hands(self):
+        """Delete all hands of this game in one query."""
+        Hand.objects.filter(game=self).delete()
+
+    def phase1_next_turn(self, hands: dict = None):
         """
         Rotate the turn variable in this class to indicate a next Player.
 
         Also starts phase 2 if necessary
+        :param hands: a dictionary mapping player ids to Hand objects as returned by get_hands, loaded if None. Altered
+        hands are saved in one query
         :return: None
         """
-        least_cards = BusHand.MAX_CARDS_IN_HAND
-        player_turn = self.current_player_index
-        for i in range(0, len(self.room.players)):
-            if len(Hand.get_hand(self.room.players[i], self).hand.hand) < least_cards:
-                least_cards = len(Hand.get_hand(self.room.players[i], self).hand.hand)
-                player_turn = i
-        if least_cards == BusHand.MAX_CARDS_IN_HAND:
+        players = self.room.players
+        if hands is None:
+            hands = self.get_hands(players)
+        else:
+            self.save_hands(hands.values())
+        player_turn = BusGame.get_question_round_player([len(hands[player.id].hand.hand) for player in players])
+        if player_turn is None:
             self.start_phase_2()
         else:
             self.current_player_index = player_turn
             self.save()
 
-    def handle_phase1_first_question(self, player, value):
-        """Handle first question of phase 1."""
-        card = self.get_card()
-        hand = Hand.get_hand(player, self)
-        hand.add_card_to_hand(card)
-        answer = BusGame.get_question_round_question_1_outcome(value, card)
-        return answer, False
-
-    def handle_phase1_second_question(self, player, value):
-        """Handle second question of phase 1."""
-        drawn_card = self.get_card()
-        hand = Hand.get_hand(player, self)
-        current_card = hand.card_list[0]
-        hand.add_card_to_hand(drawn_card)
-        outcome = BusGame.get_question_round_question_2_outcome(value, current_card, drawn_card)
-        if outcome and value == BusGame.VALUE_SAME:
-            return outcome, True
-        else:
-            return outcome, False
-
-    def handle_phase1_third_question(self, player, value):
-        """Handle third question of phase 1."""
-        drawn_card = self.get_card()
-        hand = Hand.get_hand(player, self)
-        first_card = hand.card_list[0]
-        second_card = hand.card_list[1]
-        hand.add_card_to_hand(drawn_card)
-        outcome = BusGame.get_question_round_question_3_outcome(value, first_card, second_card, drawn_card)
-        if value == BusGame.VALUE_SAME:
-            return outcome, True
-        else:
-            return outcome, False
+    def handle_phase1_question(self, player, value, hand=None):
+        """
+        Handle the phase 1 question matching the amount of cards in the hand of a player.
 
-    def handle_phase1_fourth_question(self, player, value):
-        """Handle fourth question of phase 1."""
-        drawn_card = self.get_card()
-        hand = Hand.get_hand(player, self)
-        cards = [x for x in hand.hand.hand[:3]]
-        hand.add_card_to_hand(drawn_card)
-        outcome = BusGame.get_question_round_question_4_outcome(value, cards, drawn_card)
-        if value == BusGame.VALUE_SAME:
-            return outcome, True
-        else:
-            return outcome, False
+        :param player: the Player answering the question
+        :param value: the answer of the player
+        :param hand: the Hand of the player, loaded and saved if None. A given hand is not saved, pass it to save_hands
+        :return: a tuple (correct, group drink)
+        """
+        drawn_card = self.get_card(save=False)
+        save = hand is None
+        hand = Hand.get_hand(player, self) if hand is None else hand
+        cards = [x for x in hand.card_list]
+        hand.add_card_to_hand(drawn_card, save=save)
+        return BusGame.get_question_round_outcome(value, cards, drawn_card)
 
     def handle_phase1_answer(self, player, value: int):
         """Handle a phase 1 answer."""
-        if player not in self.room.players or player.id is not self.current_player.id:
+        if self.room.player_position(player) is None or player.id != self.current_player.id:
             return None
-        hand = Hand.get_hand(player, self)
-        if len(hand.hand.hand) == 0:
-            correct, group_drink = self.handle_phase1_first_question(player, value)
-            self.phase1_next_turn()
-            return {"drink": not correct, "group_drink": group_drink and correct}
-        elif len(hand.hand.hand) == 1:
-            correct, group_drink = self.handle_phase1_second_question(player, value)
-            self.phase1_next_turn()
-            return {"drink": not correct, "group_drink": group_drink and correct}
-        elif len(hand.hand.hand) == 2:
-            correct, group_drink = self.handle_phase1_third_question(player, value)
-            self.phase1_next_turn()
-            return {"drink": not correct, "group_drink": group_drink and correct}
-        elif len(hand.hand.hand) == 3:
-            correct, group_drink = self.handle_phase1_fourth_question(player, value)
-            self.phase1_next_turn()
-            return {"drink": not correct, "group_drink": group_drink and correct}
-        else:
+        hands = self.get_hands()
+        hand = hands[player.id]
+        if len(hand.hand.hand) >= BusHand.MAX_CARDS_IN_HAND:
             return None
+        correct, group_drink = self.handle_phase1_question(player, value, hand=hand)
+        self.phase1_next_turn(hands=hands)
+        return {"drink": not correct, "group_drink": group_drink and correct}
 
     @property
     def current_bus_card(self) -> BusCard:
@@ -382,7 +551,7 @@ class BusGameModel(models.Model):
 
     def add_card_to_pile(self, player, suit, rank):
         """Add a card to the pyramid card pile while first checking if it can be removed from the player."""
-        if player not in self.room.players:
+        if self.room.player_position(player) is None or not BusCard.is_card(suit, rank):
             return False
         hand = Hand.get_hand(player, self)
         if self.game.pyramid.can_add_cards() and hand.remove_card_from_hand(BusCard(suit, rank)):
@@ -410,6 +579,11 @@ class BusGameModel(models.Model):
             return False, self.game.pyramid.owner_of_id(random_id)
 
     def execute_message(self, message, player):
+        """Execute a websocket message, see run_atomic."""
+        with instrumentation.timer("game"):
+            self.run_atomic(self._execute_message, message, player)
+
+    def _execute_message(self, message, player):
         """Execute a websocket message."""
         if "phase" in message.keys():
             if message["phase"] == "phase1":
@@ -419,6 +593,28 @@ class BusGameModel(models.Model):
             elif message["phase"] == "phase3":
                 BusGameConsumer.handle_phase3_message(message, player)
 
+    def render_shared_fragments(self) -> dict:
+        """
+        Render the page fragments of this game that are the same for all players.
+
+        :return: a dictionary mapping container ids to html
+        """
+        # Imported here as the template tags import this module
+        from .fragments import render_shared_fragments
+
+        return render_shared_fragments(self)
+
+    def render_player_fragments(self, player) -> dict:
+        """
+        Render the page fragments of this game that differ per player.
+
+        :param player: the Player to render the fragments for
+        :return: a dictionary mapping container ids to html, overriding the shared fragments
+        """
+        from .fragments import render_player_fragments
+
+        return render_player_fragments(self, player)
+
     @staticmethod
     def game_name():
         """Get the name of this game."""
@@ -456,47 +652,67 @@ class Hand(models.Model):
         """
         Initialize BusGameModel object.
 
-        This initializes the _hand property that holds the BusHand object. _original_state will also be initialized as
-        a way to see whether the hand state was manually changed in the save method.
+        The BusHand object held in the _hand property is only constructed when the hand property is first accessed.
+        _original_state will be initialized as a way to see whether the hand state was manually changed in the save
+        method.
         :param args: arguments
         :param kwargs: keyword arguments
         """
         super(Hand, self).__init__(*args, **kwargs)
-        if self.state is None:
-            self._hand = BusHand()
-        else:
-            self._hand = BusHand.from_json(self.state)
-
+        self._hand = None
         self._original_state = self.state
 
     def save(self, *args, **kwargs):
         """
         Save method for Hand object.
 
-        Creates a slug for the game
+        The state is only serialized again if the BusHand object was altered.
         :param args: arguments
         :param kwargs: keyword arguments
         :return: None
         """
-        if self._original_state == self.state:
-            self.state = self._hand.to_json()
-            self._original_state = self.state
+        self.update_state()
         super(Hand, self).save(*args, **kwargs)
 
+    def update_state(self) -> bool:
+        """
+        Serialize the BusHand object into the state if it was altered.
+
+        :return: True if the state differs from the state this object was loaded or last saved with, False otherwise
+        """
+        if self._original_state == self.state:
+            if self._hand is not None and self._hand.changed:
+                with instrumentation.timer("serialization"):
+                    self.state = self._hand.to_state()
+                self._hand.changed = False
+        else:
+            self._hand = None
+        state_changed = self._original_state != self.state
+        self._original_state = self.state
+        return state_changed
+
     @property
     def hand(self):
-        """Get the _hand object."""
+        """Get the _hand object, construct it from the state if it is not loaded yet."""
+        if self._hand is None:
+            if self.state is None:
+                self._hand = BusHand()
+            else:
+                with instrumentation.timer("serialization"):
+                    self._hand = BusHand.from_state(self.state)
         return self._hand
 
-    def add_card_to_hand(self, card: BusCard) -> bool:
+    def add_card_to_hand(self, card: BusCard, save=True) -> bool:
         """
         Add a card to this hand.
 
         :param card: the card to add
-        :return: None
+        :param save: whether to save this hand, altered hands can also be saved in one query with save_hands
+        :return: True if the card was added, False otherwise
         """
         if self.hand.add_card(card):
-            self.save()
+            if save:
+                self.save()
             return True
         return False
 
@@ -0,0 +1,178 @@
+"""
+Benchmark of the serialization of game states.
+
+Games, pyramids, buses, hands and cards in representative states are exported and imported in every format. The time
+and the peak of the memory allocated per operation are measured without database, owners of cards are resolved from a
+dictionary of simulated players.
+"""
+import random
+import time
+import tracemalloc
+
+from .encoding import StateReader, StateWriter
+from .services import Bus, BusCard, BusGame, BusHand, Pyramid
+from .simulator import SimulatedPlayer
+
+FORMATS = ["dict", "json", "state"]
+
+AMOUNT_OF_PLAYERS = 8
+# The pyramid card that is open in the phase 2 fixtures, counted from the last card of the pyramid
+OPEN_PYRAMID_CARDS = 8
+
+
+def create_players() -> dict:
+    """Create the owners of the cards in the fixtures, a dictionary mapping player ids to SimulatedPlayer objects."""
+    return {player_id: SimulatedPlayer(player_id, None) for player_id in range(1, AMOUNT_OF_PLAYERS + 1)}
+
+
+def create_fixtures(players: dict, seed: int = None) -> dict:
+    """
+    Create the objects to serialize.
+
+    :param players: the owners of the cards, see create_players
+    :param seed: seed for shuffling the decks
+    :return: a dictionary mapping fixture names to tuples (class of the object, object)
+    """
+    if seed is not None:
+        random.seed(seed)
+    owners = list(players.values())
+
+    fresh_game = BusGame()
+
+    phase_2_game = BusGame()
+    hands = [BusHand() for _ in owners]
+    for _ in range(BusHand.MAX_CARDS_IN_HAND):
+        for hand in hands:
+            hand.add_card(phase_2_game.draw_card())
+    phase_2_game.set_pyramid()
+    for _ in range(OPEN_PYRAMID_CARDS):
+        phase_2_game.pyramid.set_next_pyramid_card()
+    # Every player places all cards on the open pyramid card, the most cards_on_pyramid a pyramid card can have
+    for owner, hand in zip(owners, hands):
+        for card in hand.hand:
+            card = card.copy()
+            card.owner = owner
+            phase_2_game.pyramid.add_card_to_pyramid(card)
+
+    phase_3_game = BusGame()
+    phase_3_game.set_bus()
+    for guess in ["higher", "lower", "higher"]:
+        phase_3_game.bus.guess_card(guess, phase_3_game.draw_card())
+
+    full_hand = BusHand(preset=[card.copy() for card in hands[0].hand])
+    card = phase_2_game.pyramid.cards_on_pyramid[0]
+
+    for game in (fresh_game, phase_2_game, phase_3_game):
+        game.clear_journal()
+    return {
+        "fresh game": (BusGame, fresh_game),
+        "phase 2 game": (BusGame, phase_2_game),
+        "phase 3 game": (BusGame, phase_3_game),
+        "phase 2 pyramid": (Pyramid, phase_2_game.pyramid),
+        "phase 3 bus": (Bus, phase_3_game.bus),
+        "full hand": (BusHand, full_hand),
+        "owned card": (BusCard, card),
+    }
+
+
+def get_operations(state_class, obj, data_format: str, players: dict):
+    """
+    Get the export and import operations of an object in a format.
+
+    :param state_class: the class of the object
+    :param obj: the object
+    :param data_format: "dict" for to_dict and from_dict, "json" for to_json and from_json, "state" for the compact
+    state format
+    :param players: the owners of the cards, see create_players
+    :return: a tuple (export function, import function taking the exported data, size of the exported data or None)
+    """
+    if data_format == "dict":
+        return obj.to_dict, lambda data: state_class.from_dict(data, players=players), None
+    elif data_format == "json":
+        data = obj.to_json()
+        return obj.to_json, lambda data: state_class.from_json(data, players=players), len(data)
+    elif data_format == "state":
+
+        def encode():
+            writer = StateWriter()
+            obj.encode(writer)
+            return writer.to_state()
+
+        def decode(data):
+            reader = StateReader(data)
+            reader.players = players
+            return state_class.decode(reader)
+
+        return encode, decode, len(encode())
+    else:
+        raise ValueError("The format must be one of {}".format(", ".join(FORMATS)))
+
+
+def measure(function, argument, iterations: int) -> dict:
+    """
+    Measure an operation.
+
+    :param function: the operation
+    :param argument: the argument of the operation, None to call it without arguments
+    :param iterations: the amount of times the duration of the operation is measured
+    :return: a dictionary with the mean duration in seconds and the peak of the memory allocated by one call in bytes
+    """
+    call = function if argument is None else lambda: function(argument)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        call()
+    seconds = (time.perf_counter() - start) / iterations
+
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.clear_traces()
+    call()
+    _, peak = tracemalloc.get_traced_memory()
+    if not tracing:
+        tracemalloc.stop()
+    return {"seconds": seconds, "bytes": peak}
+
+
+def run_serialization_benchmark(iterations: int = 1000, formats: [str] = None, seed: int = None) -> list:
+    """
+    Measure the export and import of all fixtures in all formats.
+
+    :param iterations: the amount of times the duration of each operation is measured
+    :param formats: the formats to measure, all formats if None
+    :param seed: seed for shuffling the decks of the fixtures
+    :return: a list of dictionaries with the fixture, format, operation ("export" or "import"), size of the exported
+    data in characters (None for dictionaries), mean duration in seconds and peak of the allocated memory in bytes
+    """
+    players = create_players()
+    results = list()
+    for fixture, (state_class, obj) in create_fixtures(players, seed=seed).items():
+        for data_format in FORMATS if formats is None else formats:
+            export, load, size = get_operations(state_class, obj, data_format, players)
+            data = export()
+            for operation, function, argument in (("export", export, None), ("import", load, data)):
+                result = {"fixture": fixture, "format": data_format, "operation": operation, "size": size}
+                result.update(measure(function, argument, iterations))
+                results.append(result)
+    return results
+
+
+def compare(results: list, previous: list) -> list:
+    """
+    Compare benchmark results with earlier results.
+
+    :param results: the results of run_serialization_benchmark
+    :param previous: earlier results of run_serialization_benchmark
+    :return: the results with for every result that was measured before the relative change of the duration and the
+    allocated memory in "seconds_change" and "bytes_change"
+    """
+    earlier = {(x["fixture"], x["format"], x["operation"]): x for x in previous}
+    compared = list()
+    for result in results:
+        result = dict(result)
+        before = earlier.get((result["fixture"], result["format"], result["operation"]))
+        if before is not None:
+            for key in ("seconds", "bytes"):
+                result[key + "_change"] = result[key] / before[key] - 1 if before[key] else None
+        compared.append(result)
+    return compared
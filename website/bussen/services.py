@@ -1,14 +1,21 @@
 import secrets
 
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Exists, OuterRef
 from django.urls import reverse
-from pyCardDeck import Deck, BaseCard
+from pyCardDeck import Deck
 
 import bussen.models
 import json
 import math
 
+from games.services import delete_in_batches
+from rooms.models import Room
+from .cache import game_cache
+from .encoding import StateReader, StateWriter, StateFormatException, is_legacy_state
+
+DATA_MINIMISATION_BATCH_SIZE = 1000
+
 
 class BusGameConsumer:
     """BusGameConsumer, handle all websocket game input for bussen game."""
@@ -20,64 +27,40 @@ class BusGameConsumer:
             if message["type"] == "answer":
                 BusGameConsumer.handle_phase1_message_answer(player, message["value"])
                 if player.room.game.phase != bussen.models.BusGameModel.PHASE_1:
-                    channel_layer = get_channel_layer()
-                    async_to_sync(channel_layer.group_send)(
-                        player.room.slug,
-                        {
-                            "type": "send_group_message",
-                            "text": json.dumps(
-                                {"type": "redirect", "delay": 3000, "url": reverse("bussen:redirect"),}  # noqa
-                            ),
-                        },
+                    player.room.send_group_message(
+                        json.dumps({"type": "redirect", "delay": 3000, "url": reverse("bussen:redirect"),})  # noqa
                     )
 
     @staticmethod
     def handle_phase1_message_answer(player, value):
         """Handle phase1 message of type answer."""
         answer = player.room.game.handle_phase1_answer(player, value)
-        channel_layer = get_channel_layer()
         if answer is not None:
             if answer["group_drink"]:
-                async_to_sync(channel_layer.group_send)(
-                    player.room.slug,
-                    {
-                        "type": "send_group_message",
-                        "text": json.dumps(
-                            {
-                                "type": "message",
-                                "color": "yellow",
-                                "message": f"{player} guessed correctly. Everyone must drink.",
-                            }
-                        ),
-                    },
+                player.room.send_group_message(
+                    json.dumps(
+                        {
+                            "type": "message",
+                            "color": "yellow",
+                            "message": f"{player} guessed correctly. Everyone must drink.",
+                        }
+                    )
                 )
             elif answer["drink"]:
-                async_to_sync(channel_layer.group_send)(
-                    player.room.slug,
-                    {
-                        "type": "send_group_message",
-                        "text": json.dumps(
-                            {
-                                "type": "message",
-                                "color": "red",
-                                "message": f"{player} guessed incorrectly. They need to drink.",
-                            }
-                        ),
-                    },
+                player.room.send_group_message(
+                    json.dumps(
+                        {
+                            "type": "message",
+                            "color": "red",
+                            "message": f"{player} guessed incorrectly. They need to drink.",
+                        }
+                    )
                 )
             else:
-                async_to_sync(channel_layer.group_send)(
-                    player.room.slug,
-                    {
-                        "type": "send_group_message",
-                        "text": json.dumps(
-                            {"type": "message", "color": "green", "message": f"{player} guessed correctly."}
-                        ),
-                    },
+                player.room.send_group_message(
+                    json.dumps({"type": "message", "color": "green", "message": f"{player} guessed correctly."})
                 )
-            async_to_sync(channel_layer.group_send)(
-                player.room.slug, {"type": "send_group_message", "text": json.dumps({"type": "refresh"})}
-            )
+            player.room.send_group_fragments()
 
     @staticmethod
     def handle_phase2_message(message, player):
@@ -93,77 +76,48 @@ class BusGameConsumer:
     @staticmethod
     def handle_phase2_message_card(message, player):
         """Handle phase2 message of type card."""
-        channel_layer = get_channel_layer()
         if message["suit"] is not None and message["rank"] is not None:
             if player.room.game.add_card_to_pile(player, message["suit"], message["rank"]):
-                async_to_sync(channel_layer.group_send)(
-                    player.room.slug, {"type": "send_group_message", "text": json.dumps({"type": "refresh"})}
-                )
-                async_to_sync(channel_layer.group_send)(
-                    player.room.slug,
-                    {
-                        "type": "send_group_message",
-                        "text": json.dumps(
-                            {"type": "message", "color": "yellow", "message": f"{player} placed a card."}
-                        ),
-                    },
+                player.room.send_group_fragments()
+                player.room.send_group_message(
+                    json.dumps({"type": "message", "color": "yellow", "message": f"{player} placed a card."})
                 )
 
     @staticmethod
     def handle_phase2_message_call(message, player):
         """Handle phase2 message of type call."""
-        channel_layer = get_channel_layer()
         removed, card_of_player = player.room.game.call_card(message["id"])
         if removed:
-            async_to_sync(channel_layer.group_send)(
-                player.room.slug, {"type": "send_group_message", "text": json.dumps({"type": "refresh"})},
-            )
-            async_to_sync(channel_layer.group_send)(
-                player.room.slug,
-                {
-                    "type": "send_group_message",
-                    "text": json.dumps(
-                        {
-                            "type": "message",
-                            "color": "yellow",
-                            "message": f"{card_of_player}'s card was not correct. {card_of_player} must drink.",
-                        }
-                    ),
-                },
+            player.room.send_group_fragments()
+            player.room.send_group_message(
+                json.dumps(
+                    {
+                        "type": "message",
+                        "color": "yellow",
+                        "message": f"{card_of_player}'s card was not correct. {card_of_player} must drink.",
+                    }
+                )
             )
         else:
-            async_to_sync(channel_layer.group_send)(
-                player.room.slug,
-                {
-                    "type": "send_group_message",
-                    "text": json.dumps(
-                        {
-                            "type": "message",
-                            "color": "yellow",
-                            "message": f"{card_of_player}'s card was correct. {player} must drink.",
-                        }
-                    ),
-                },
+            player.room.send_group_message(
+                json.dumps(
+                    {
+                        "type": "message",
+                        "color": "yellow",
+                        "message": f"{card_of_player}'s card was correct. {player} must drink.",
+                    }
+                )
             )
 
     @staticmethod
     def handle_phase2_message_next_card(message, player):
         """Handle phase2 message of type next_card."""
-        channel_layer = get_channel_layer()
         if player.room.game.phase2_next_turn(message["index"]):
             if player.room.game.phase == bussen.models.BusGameModel.PHASE_2:
-                async_to_sync(channel_layer.group_send)(
-                    player.room.slug, {"type": "send_group_message", "text": json.dumps({"type": "refresh"})},
-                )
+                player.room.send_group_fragments()
         if player.room.game.phase != bussen.models.BusGameModel.PHASE_2:
-            async_to_sync(channel_layer.group_send)(
-                player.room.slug,
-                {
-                    "type": "send_group_message",
-                    "text": json.dumps(
-                        {"type": "redirect", "delay": 3000, "url": reverse("bussen:redirect"),}  # noqa
-                    ),
-                },
+            player.room.send_group_message(
+                json.dumps({"type": "redirect", "delay": 3000, "url": reverse("bussen:redirect"),})  # noqa
             )
 
     @staticmethod
@@ -176,44 +130,89 @@ class BusGameConsumer:
     @staticmethod
     def handle_phase3_message_guess(message, player):
         """Handle phase3 message of type guess."""
-        channel_layer = get_channel_layer()
         if message["index"] == player.room.game.game.bus.current_card_index:
             correct = player.room.game.phase3_guess(message["guess"], player)
             if correct is not None:
                 if not correct:
-                    async_to_sync(channel_layer.group_send)(
-                        player.room.slug,
-                        {
-                            "type": "send_group_message",
-                            "text": json.dumps(
-                                {
-                                    "type": "message",
-                                    "color": "red",
-                                    "message": f"{player} guessed incorrectly and must drink",
-                                }
-                            ),
-                        },
+                    player.room.send_group_message(
+                        json.dumps(
+                            {
+                                "type": "message",
+                                "color": "red",
+                                "message": f"{player} guessed incorrectly and must drink",
+                            }
+                        )
                     )
 
-            async_to_sync(channel_layer.group_send)(
-                player.room.slug, {"type": "send_group_message", "text": json.dumps({"type": "refresh"})},
-            )
+            player.room.send_group_fragments()
 
             if player.room.game.phase == bussen.models.BusGameModel.PHASE_FINISHED:
-                async_to_sync(channel_layer.group_send)(
-                    player.room.slug,
-                    {
-                        "type": "send_group_message",
-                        "text": json.dumps({"type": "celebrate", "url": reverse("bussen:redirect"),}),  # noqa
-                    },
+                player.room.send_group_message(
+                    json.dumps({"type": "celebrate", "url": reverse("bussen:redirect"),})  # noqa
                 )
                 player.room.game.delete()
                 player.room.game = None
                 player.room.save()
 
 
-class BusCard(BaseCard):
-    """BusCard class."""
+class CardFace:
+    """
+    Immutable identity of one of the 52 playing cards.
+
+    Only the interned instances in CARD_FACES exist, so faces are compared by identity. The card number and the value
+    of the rank are computed once.
+    """
+
+    __slots__ = ("suit", "rank", "number", "value", "name")
+
+    RANK_VALUES = {"J": 11, "Q": 12, "K": 13, "A": 14}
+
+    def __init__(self, suit: str, rank: str, number: int):
+        """
+        Initialize a CardFace object, only used to create CARD_FACES.
+
+        :param suit: the suit
+        :param rank: the rank
+        :param number: the card number (0 up to and including 51) as used in the compact state format
+        """
+        object.__setattr__(self, "suit", suit)
+        object.__setattr__(self, "rank", rank)
+        object.__setattr__(self, "number", number)
+        object.__setattr__(self, "value", self.RANK_VALUES.get(rank) or int(rank))
+        object.__setattr__(self, "name", f"{suit} {rank}")
+
+    def __setattr__(self, key, value):
+        """Prevent altering a CardFace, it is shared by all cards with this suit and rank."""
+        raise AttributeError("CardFace objects are immutable")
+
+    def __repr__(self):
+        """Convert this object to a representation."""
+        return "CardFace({})".format(self.name)
+
+    @staticmethod
+    def get(suit, rank):
+        """
+        Get the interned face of a suit and rank.
+
+        :param suit: the suit
+        :param rank: the rank
+        :return: the CardFace object, None if there is no card with this suit and rank
+        """
+        try:
+            return CARD_FACES_BY_NAME.get((suit, rank))
+        except TypeError:
+            return None
+
+
+class BusCard:
+    """
+    BusCard class.
+
+    The suit and rank of a card are stored as a shared CardFace, the card itself only holds the state of this copy of
+    the card.
+    """
+
+    __slots__ = ("face", "closed", "owner", "random_id")
 
     def __init__(self, suit: str, rank: str, closed: bool = False, owner=None, random_id: str = None):
         """
@@ -225,66 +224,153 @@ class BusCard(BaseCard):
         :param owner: the owner (Player) of this card
         :param random_id: a random identifier for this card
         """
-        super().__init__(f"{suit} {rank}")
-        self.suit = suit
-        self.rank = rank
+        face = CardFace.get(suit, rank)
+        if face is None:
+            raise ValueError("There is no card {} {}".format(suit, rank))
+        self.face = face
         self.closed = True if closed else False
         self.owner = owner
         self.random_id = random_id
 
+    @staticmethod
+    def from_face(face: CardFace, closed: bool = False, owner=None, random_id: str = None):
+        """Create a BusCard from a CardFace."""
+        card = BusCard.__new__(BusCard)
+        card.face = face
+        card.closed = True if closed else False
+        card.owner = owner
+        card.random_id = random_id
+        return card
+
+    @staticmethod
+    def is_card(suit, rank) -> bool:
+        """Check if a suit and rank, for example received from a player, are a valid card."""
+        return CardFace.get(suit, rank) is not None
+
+    @property
+    def suit(self) -> str:
+        """Get the suit of this card."""
+        return self.face.suit
+
+    @property
+    def rank(self) -> str:
+        """Get the rank of this card."""
+        return self.face.rank
+
+    @property
+    def name(self) -> str:
+        """Get the name of this card."""
+        return self.face.name
+
+    def __str__(self):
+        """Convert this object to string."""
+        return self.face.name
+
+    def __repr__(self):
+        """Convert this object to a representation."""
+        return "BusCard({})".format(self.to_dict())
+
     def __eq__(self, other):
         """Check if a BusCard is equal to this BusCard."""
-        return self.suit == other.suit and self.rank == other.rank
+        return self.face is other.face
 
     def __lt__(self, other):
         """Check if a BusCard is less than this BusCard."""
-        return self.to_int() < other.to_int()
+        return self.face.value < other.face.value
+
+    def __gt__(self, other):
+        """Check if a BusCard is greater than this BusCard."""
+        return self.face.value > other.face.value
 
     def to_int(self):
         """Convert a card rank to an Integer."""
-        if self.rank == "J":
-            return 11
-        elif self.rank == "Q":
-            return 12
-        elif self.rank == "K":
-            return 13
-        elif self.rank == "A":
-            return 14
-        else:
-            return int(self.rank)
+        return self.face.value
 
     def to_dict(self):
         """Convert to dictionary."""
         return {
-            "suit": self.suit,
-            "rank": self.rank,
+            "suit": self.face.suit,
+            "rank": self.face.rank,
             "closed": self.closed,
             "owner": self.owner.id if self.owner is not None else None,
             "random_id": self.random_id,
         }
 
     @staticmethod
-    def from_dict(dictionary: dict):
-        """Import from dictionary."""
+    def from_dict(dictionary: dict, players: dict = None):
+        """
+        Import from dictionary.
+
+        :param dictionary: the dictionary to import
+        :param players: a dictionary mapping player ids to Player objects used to resolve the owner, if None the owner
+        is queried
+        :return: a BusCard object
+        """
+        if players is None:
+            players = BusCard.get_owners([dictionary])
         return BusCard(
             dictionary["suit"],
             dictionary["rank"],
             closed=dictionary["closed"],
-            owner=bussen.models.Player.objects.get(id=dictionary["owner"])
-            if dictionary["owner"] is not None and bussen.models.Player.objects.filter(id=dictionary["owner"]).exists()
-            else None,
+            owner=players.get(dictionary["owner"]) if dictionary["owner"] is not None else None,
             random_id=dictionary["random_id"],
         )
 
+    @staticmethod
+    def get_owners(dictionaries: [dict]) -> dict:
+        """
+        Resolve the owners of card dictionaries in one query.
+
+        :param dictionaries: a list of card dictionaries
+        :return: a dictionary mapping player ids to Player objects, owners that do not exist anymore are left out
+        """
+        return BusCard.get_players({x["owner"] for x in dictionaries if x["owner"] is not None})
+
+    @staticmethod
+    def get_players(player_ids) -> dict:
+        """
+        Get players by their ids in one query.
+
+        :param player_ids: an iterable of player ids
+        :return: a dictionary mapping player ids to Player objects, players that do not exist are left out
+        """
+        player_ids = set(player_ids)
+        if len(player_ids) == 0:
+            return dict()
+        return bussen.models.Player.objects.in_bulk(player_ids)
+
+    @property
+    def number(self) -> int:
+        """Get the card number of this card (0 up to and including 51) as used in the compact state format."""
+        return self.face.number
+
+    @staticmethod
+    def from_number(number: int, closed: bool = False, owner=None, random_id: str = None):
+        """Create a BusCard from a card number (0-51)."""
+        if not 0 <= number < len(CARD_FACES):
+            raise ValueError("There is no card number {}".format(number))
+        return BusCard.from_face(CARD_FACES[number], closed=closed, owner=owner, random_id=random_id)
+
+    def encode(self, writer: StateWriter):
+        """Encode to the compact state format."""
+        owner_id = self.owner.id if self.owner is not None else None
+        writer.write_card(self.face.number, self.closed, owner_id, self.random_id)
+
+    @staticmethod
+    def decode(reader: StateReader):
+        """Decode from the compact state format."""
+        number, closed, owner, random_id = reader.read_card()
+        return BusCard.from_number(number, closed=closed, owner=owner, random_id=random_id)
+
     def to_json(self):
         """Convert to json."""
         return json.dumps(self.to_dict())
 
     @staticmethod
-    def from_json(json_str):
+    def from_json(json_str, players: dict = None):
         """Import from json."""
         dictionary = json.loads(json_str)
-        return BusCard.from_dict(dictionary)
+        return BusCard.from_dict(dictionary, players=players)
 
     @staticmethod
     def create_random_card_id():
@@ -293,11 +379,16 @@ class BusCard(BaseCard):
 
     def copy(self):
         """Copy this object."""
-        return BusCard(self.suit, self.rank, closed=self.closed, owner=self.owner, random_id=self.random_id)
+        return BusCard.from_face(self.face, closed=self.closed, owner=self.owner, random_id=self.random_id)
 
 
 class Pyramid:
-    """Bus Pyramid class."""
+    """
+    Bus Pyramid class.
+
+    The cards of the pyramid are stored in one flat list, the nested pyramid holds the same cards per layer. The cards
+    on the pyramid are indexed by their random identifier.
+    """
 
     def __init__(self, preset: [[BusCard]] = None, cards_on_pyramid: [BusCard] = None, current_card_index: int = None):
         """
@@ -307,29 +398,52 @@ class Pyramid:
         :param cards_on_pyramid: a list of BusCards indicating the cards on the pyramid
         :param current_card_index: the current active pyramid card index
         """
+        self.changed = False
+        self.journal = list()
         self.current_card_index = current_card_index
-        if cards_on_pyramid is None:
-            self.cards_on_pyramid = list()
-        else:
-            self.cards_on_pyramid = cards_on_pyramid
-        if preset is None:
-            self.pyramid = list()
-        else:
-            self.pyramid = preset
+        self.cards_on_pyramid = list() if cards_on_pyramid is None else cards_on_pyramid
+        self.pyramid = list() if preset is None else preset
+
+    @property
+    def pyramid(self) -> [[BusCard]]:
+        """Get the layers of the pyramid, lists of the same BusCard objects as in the flat cards list."""
+        return self._layers
+
+    @pyramid.setter
+    def pyramid(self, layers: [[BusCard]]):
+        """Set the layers of the pyramid, updating the flat cards list."""
+        self._layers = [list(layer) for layer in layers]
+        self.cards = [card for layer in self._layers for card in layer]
+
+    @property
+    def cards_on_pyramid(self) -> [BusCard]:
+        """Get the cards placed on the current pyramid card, use place_card and remove_card_in_pyramid_list to edit."""
+        return self._cards_on_pyramid
+
+    @cards_on_pyramid.setter
+    def cards_on_pyramid(self, cards: [BusCard]):
+        """Set the cards placed on the current pyramid card, updating the index of random identifiers."""
+        self._cards_on_pyramid = list(cards)
+        self._cards_by_id = dict()
+        for card in self._cards_on_pyramid:
+            if card.random_id is not None:
+                self._cards_by_id.setdefault(card.random_id, card)
 
     def construct(self, layers: [int], deck: Deck):
         """Construct a new Pyramid."""
         cards_needed = sum(layers)
         if len(list(deck)) < cards_needed:
             raise ValueError("There are not enough cards in the deck to build a pyramid")
-        self.pyramid = list()
+        new_pyramid = list()
         for layer in layers:
             new_layer = list()
             for _ in range(0, layer):
                 new_card = deck.draw()
                 new_card.closed = True
                 new_layer.append(new_card)
-            self.pyramid.append(new_layer)
+            new_pyramid.append(new_layer)
+        self.pyramid = new_pyramid
+        self._record(BusGame.OPERATION_SNAPSHOT)
         if cards_needed > 0:
             self.current_card_index = cards_needed
         else:
@@ -337,6 +451,7 @@ class Pyramid:
 
     def set_next_pyramid_card(self):
         """Set next pyramid card as active."""
+        self._record(BusGame.OPERATION_NEXT_PYRAMID_CARD)
         if self.current_card_index > 0:
             self.current_card_index -= 1
             self.current_card().closed = False
@@ -348,69 +463,71 @@ class Pyramid:
 
     def current_card(self):
         """Get the current active pyramid card."""
-        flattened_pyramid = [x for row in self.pyramid for x in row]
-        if self.current_card_index is not None and 0 <= self.current_card_index < len(flattened_pyramid):
-            return flattened_pyramid[self.current_card_index]
+        if self.can_add_cards():
+            return self.cards[self.current_card_index]
         else:
             return None
 
     def can_add_cards(self):
         """Check if cards can be added to pyramid."""
-        flattened_pyramid = [x for row in self.pyramid for x in row]
-        return self.current_card_index is not None and 0 <= self.current_card_index < len(flattened_pyramid)
+        return self.current_card_index is not None and 0 <= self.current_card_index < len(self.cards)
 
     def add_card_to_pyramid(self, card: BusCard):
         """Add a card to the pyramid card list."""
         copy = card.copy()
         copy.random_id = BusCard.create_random_card_id()
-        self.cards_on_pyramid.append(copy)
+        self.place_card(copy)
+
+    def place_card(self, card: BusCard):
+        """Place a card with an owner and random identifier in the pyramid card list."""
+        self._cards_on_pyramid.append(card)
+        if card.random_id is not None:
+            self._cards_by_id.setdefault(card.random_id, card)
+        self._record(
+            "{}{},{},{}".format(
+                BusGame.OPERATION_PLACE_CARD,
+                card.number,
+                card.owner.id if card.owner is not None else "",
+                card.random_id,
+            )
+        )
 
     def id_in_cards_list(self, random_id: str) -> bool:
         """Check if a random identifier of a BusCard is in the pyramid card list."""
-        if random_id is None:
-            return False
-        for card in self.cards_on_pyramid:
-            if card.random_id == random_id:
-                return True
-        return False
+        return random_id is not None and random_id in self._cards_by_id
 
     def owner_of_id(self, random_id: str):
         """Get the owner of a random identifier of a BusCard in the pyramid card list."""
-        if random_id is None:
-            return None
-
-        for card in self.cards_on_pyramid:
-            if card.random_id == random_id:
-                return card.owner
-        return None
+        card = self._cards_by_id.get(random_id) if random_id is not None else None
+        return card.owner if card is not None else None
 
     def remove_card_in_pyramid_list(self, random_id: str):
         """Remove a card with a random identifier from the pyramid card list."""
-        for i in range(0, len(self.cards_on_pyramid)):
-            if self.cards_on_pyramid[i].random_id == random_id:
-                if self.current_card() is not None and self.cards_on_pyramid[i].rank == self.current_card().rank:
-                    return None
-                else:
-                    card = self.cards_on_pyramid[i]
-                    del self.cards_on_pyramid[i]
-                    return card
-        return None
+        card = self._cards_by_id.get(random_id) if random_id is not None else None
+        if card is None:
+            return None
+        current_card = self.current_card()
+        if current_card is not None and card.rank == current_card.rank:
+            return None
+        for i, placed_card in enumerate(self._cards_on_pyramid):
+            if placed_card is card:
+                del self._cards_on_pyramid[i]
+                break
+        del self._cards_by_id[random_id]
+        self._record(BusGame.OPERATION_REMOVE_CARD + random_id)
+        return card
+
+    def _record(self, operation: str):
+        """Record an operation in the journal and mark this pyramid as changed."""
+        self.journal.append(operation)
+        self.changed = True
 
     def copy(self):
         """Copy this object."""
-        pyramid_copy = list()
-        for row in self.pyramid:
-            layer_copy = list()
-            for card in row:
-                layer_copy.append(card.copy())
-            pyramid_copy.append(layer_copy)
-
-        cards_on_pyramid_copy = list()
-        for card in self.cards_on_pyramid:
-            cards_on_pyramid_copy.append(card.copy())
-
         return Pyramid(
-            preset=pyramid_copy, current_card_index=self.current_card_index, cards_on_pyramid=cards_on_pyramid_copy
+            preset=[[card.copy() for card in layer] for layer in self.pyramid],
+            current_card_index=self.current_card_index,
+            cards_on_pyramid=[card.copy() for card in self.cards_on_pyramid],
         )
 
     def to_dict(self):
@@ -428,17 +545,30 @@ class Pyramid:
         }
 
     @staticmethod
-    def from_dict(dictionary):
-        """Import from dictionary."""
+    def card_dicts(dictionary) -> [dict]:
+        """Get all card dictionaries of a Pyramid dictionary."""
+        return [card for layer in dictionary["pyramid"] for card in layer] + dictionary["cards_on_pyramid"]
+
+    @staticmethod
+    def from_dict(dictionary, players: dict = None):
+        """
+        Import from dictionary.
+
+        :param dictionary: the dictionary to import
+        :param players: a dictionary mapping player ids to Player objects, if None all owners are queried at once
+        :return: a Pyramid object
+        """
+        if players is None:
+            players = BusCard.get_owners(Pyramid.card_dicts(dictionary))
         list_pyramid = list()
         for layer in dictionary["pyramid"]:
             new_layer = list()
             for card in layer:
-                new_layer.append(BusCard.from_dict(card))
+                new_layer.append(BusCard.from_dict(card, players=players))
             list_pyramid.append(new_layer)
         return Pyramid(
             preset=list_pyramid,
-            cards_on_pyramid=[BusCard.from_dict(x) for x in dictionary["cards_on_pyramid"]],
+            cards_on_pyramid=[BusCard.from_dict(x, players=players) for x in dictionary["cards_on_pyramid"]],
             current_card_index=dictionary["current_card_index"],
         )
 
@@ -447,10 +577,32 @@ class Pyramid:
         return json.dumps(self.to_dict())
 
     @staticmethod
-    def from_json(json_str):
+    def from_json(json_str, players: dict = None):
         """Import from json."""
         dictionary = json.loads(json_str)
-        return Pyramid.from_dict(dictionary)
+        return Pyramid.from_dict(dictionary, players=players)
+
+    def encode(self, writer: StateWriter):
+        """Encode to the compact state format."""
+        writer.write_byte(len(self.pyramid))
+        for layer in self.pyramid:
+            writer.write_byte(len(layer))
+            for card in layer:
+                card.encode(writer)
+        writer.write_optional_byte(self.current_card_index)
+        writer.write_byte(len(self.cards_on_pyramid))
+        for card in self.cards_on_pyramid:
+            card.encode(writer)
+
+    @staticmethod
+    def decode(reader: StateReader):
+        """Decode from the compact state format."""
+        list_pyramid = list()
+        for _ in range(reader.read_byte()):
+            list_pyramid.append([BusCard.decode(reader) for _ in range(reader.read_byte())])
+        current_card_index = reader.read_optional_byte()
+        cards_on_pyramid = [BusCard.decode(reader) for _ in range(reader.read_byte())]
+        return Pyramid(preset=list_pyramid, cards_on_pyramid=cards_on_pyramid, current_card_index=current_card_index)
 
     def __str__(self):
         """Convert to string."""
@@ -467,6 +619,8 @@ class Bus:
         :param preset: a list of BusCards indicating the cards on the bus
         :param current_card_index: the index the bus is at in the preset list
         """
+        self.changed = False
+        self.journal = list()
         self.current_card_index = current_card_index
         if preset is None:
             self.bus = list()
@@ -484,6 +638,7 @@ class Bus:
             card.closed = True
             self.bus.append(card)
         self.current_card_index = 0
+        self._record(BusGame.OPERATION_SNAPSHOT)
 
     def guess_card(self, guess: str, card: BusCard):
         """Guess a card in the Bus."""
@@ -493,9 +648,11 @@ class Bus:
         elif guess == "lower":
             correct = current_card > card
         else:
+            guess = "same"
             correct = current_card == card
 
         self.bus[self.current_card_index] = card
+        self._record("{}{},{}".format(BusGame.OPERATION_GUESS_CARD, card.number, guess))
 
         if correct:
             self.current_card_index += 1
@@ -511,15 +668,32 @@ class Bus:
         else:
             return None
 
+    def _record(self, operation: str):
+        """Record an operation in the journal and mark this bus as changed."""
+        self.journal.append(operation)
+        self.changed = True
+
+    def copy(self):
+        """Copy this object."""
+        return Bus(preset=[x.copy() for x in self.bus], current_card_index=self.current_card_index)
+
     def to_dict(self):
         """Convert to dictionary."""
         return {"bus": [x.to_dict() for x in self.bus], "current_card_index": self.current_card_index}
 
     @staticmethod
-    def from_dict(dictionary):
-        """Import from dictionary."""
+    def from_dict(dictionary, players: dict = None):
+        """
+        Import from dictionary.
+
+        :param dictionary: the dictionary to import
+        :param players: a dictionary mapping player ids to Player objects, if None all owners are queried at once
+        :return: a Bus object
+        """
+        if players is None:
+            players = BusCard.get_owners(dictionary["bus"])
         return Bus(
-            preset=[BusCard.from_dict(x) for x in dictionary["bus"]],
+            preset=[BusCard.from_dict(x, players=players) for x in dictionary["bus"]],
             current_card_index=dictionary["current_card_index"],
         )
 
@@ -528,10 +702,23 @@ class Bus:
         return json.dumps(self.to_dict())
 
     @staticmethod
-    def from_json(json_str):
+    def from_json(json_str, players: dict = None):
         """Import from json."""
         dictionary = json.loads(json_str)
-        return Pyramid.from_dict(dictionary)
+        return Bus.from_dict(dictionary, players=players)
+
+    def encode(self, writer: StateWriter):
+        """Encode to the compact state format."""
+        writer.write_byte(len(self.bus))
+        for card in self.bus:
+            card.encode(writer)
+        writer.write_byte(self.current_card_index)
+
+    @staticmethod
+    def decode(reader: StateReader):
+        """Decode from the compact state format."""
+        preset = [BusCard.decode(reader) for _ in range(reader.read_byte())]
+        return Bus(preset=preset, current_card_index=reader.read_byte())
 
 
 class BusGame:
@@ -548,6 +735,7 @@ class BusGame:
 
     BUS_CARD_AMOUNT = 6
 
+    SUITS = [HEARTS, DIAMONDS, CLUBS, SPADES]
     RANKS = ["A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K"]
 
     VALUE_RED = 0
@@ -563,6 +751,14 @@ class BusGame:
     VALUE_HAVE_SUIT = 0
     VALUE_DO_NOT_HAVE_SUIT = 1
 
+    OPERATION_SNAPSHOT = "*"
+    OPERATION_DRAW_CARD = "d"
+    OPERATION_NEXT_PYRAMID_CARD = "n"
+    OPERATION_PLACE_CARD = "p"
+    OPERATION_REMOVE_CARD = "r"
+    OPERATION_GUESS_CARD = "g"
+    OPERATION_SEPARATOR = ";"
+
     def __init__(self, deck: Deck = None, pyramid: Pyramid = None, bus: Bus = None):
         """
         Initialize a BusGame object.
@@ -578,6 +774,22 @@ class BusGame:
             self.deck = deck
         self.pyramid = Pyramid() if pyramid is None else pyramid
         self.bus = Bus() if bus is None else bus
+        self._changed = deck is None
+        self.journal = [self.OPERATION_SNAPSHOT] if deck is None else list()
+        self.pyramid.journal = self.journal
+        self.bus.journal = self.journal
+
+    @property
+    def changed(self):
+        """Check if this game has been altered since it was created, imported or marked as unchanged."""
+        return self._changed or self.pyramid.changed or self.bus.changed
+
+    @changed.setter
+    def changed(self, value):
+        """Mark this game (including its pyramid and bus) as changed or unchanged."""
+        self._changed = value
+        self.pyramid.changed = value
+        self.bus.changed = value
 
     @staticmethod
     def generate_deck():
@@ -586,12 +798,7 @@ class BusGame:
 
         :return: List with all 52 poker playing cards
         """
-        suits = [BusGame.HEARTS, BusGame.DIAMONDS, BusGame.CLUBS, BusGame.SPADES]
-        cards = list()
-        for suit in suits:
-            for rank in BusGame.RANKS:
-                cards.append(BusCard(suit, rank))
-        return cards
+        return [BusCard.from_face(face) for face in CARD_FACES]
 
     @property
     def cards_left(self):
@@ -600,10 +807,14 @@ class BusGame:
 
     def draw_card(self):
         """Draw a card from the deck."""
+        self._changed = True
+        self.journal.append(self.OPERATION_DRAW_CARD)
         return self.deck.draw()
 
     def reset_deck(self, shuffle=True):
         """Reset the deck."""
+        self._changed = True
+        self.journal.append(self.OPERATION_SNAPSHOT)
         self.deck = Deck(cards=BusGame.generate_deck(), reshuffle=False)
         if shuffle:
             self.deck.shuffle()
@@ -616,6 +827,72 @@ class BusGame:
         """Reset the bus."""
         self.bus.construct(self.BUS_CARD_AMOUNT, self.deck)
 
+    @property
+    def requires_snapshot(self) -> bool:
+        """Check if the operations in the journal can only be stored by writing a full state."""
+        return self.OPERATION_SNAPSHOT in self.journal
+
+    @property
+    def journal_text(self) -> str:
+        """Get the operations in the journal as text, each operation is terminated by a separator."""
+        return "".join(x + self.OPERATION_SEPARATOR for x in self.journal)
+
+    def clear_journal(self):
+        """Clear the journal and mark this game as unchanged."""
+        self.journal.clear()
+        self.changed = False
+
+    def replay(self, operations: str):
+        """
+        Apply operations in the text format of journal_text to this game.
+
+        :param operations: the operations, each terminated by a separator
+        :return: None
+        """
+        operations = [(x[0], x[1:].split(",")) for x in operations.split(self.OPERATION_SEPARATOR) if x != ""]
+        players = BusCard.get_players(
+            int(arguments[1]) for code, arguments in operations if code == self.OPERATION_PLACE_CARD and arguments[1]
+        )
+        for code, arguments in operations:
+            if code == self.OPERATION_DRAW_CARD:
+                self.draw_card()
+            elif code == self.OPERATION_NEXT_PYRAMID_CARD:
+                self.pyramid.set_next_pyramid_card()
+            elif code == self.OPERATION_PLACE_CARD:
+                owner = players.get(int(arguments[1])) if arguments[1] != "" else None
+                self.pyramid.place_card(BusCard.from_number(int(arguments[0]), owner=owner, random_id=arguments[2]))
+            elif code == self.OPERATION_REMOVE_CARD:
+                self.pyramid.remove_card_in_pyramid_list(arguments[0])
+            elif code == self.OPERATION_GUESS_CARD:
+                self.bus.guess_card(arguments[1], BusCard.from_number(int(arguments[0])))
+            else:
+                raise StateFormatException("Unknown operation {}".format(code))
+        self.clear_journal()
+
+    def resolve_owners(self):
+        """
+        Look up the owners of the cards in this game again in one query, owners that do not exist anymore become None.
+
+        :return: None
+        """
+        cards = [
+            card
+            for cards in (self.deck, self.pyramid.cards, self.pyramid.cards_on_pyramid, self.bus.bus)
+            for card in cards
+            if card.owner is not None
+        ]
+        players = BusCard.get_players(card.owner.id for card in cards)
+        for card in cards:
+            card.owner = players.get(card.owner.id)
+
+    def copy(self):
+        """Copy this object."""
+        return BusGame(
+            deck=Deck(cards=[x.copy() for x in self.deck], reshuffle=False),
+            pyramid=self.pyramid.copy(),
+            bus=self.bus.copy(),
+        )
+
     @staticmethod
     def get_question_round_question(question_number):
         """Get a question for phase 1."""
@@ -697,6 +974,66 @@ class BusGame:
         else:
             return len(set([drawn_card.suit] + [x.suit for x in cards])) == 4
 
+    @staticmethod
+    def get_question_round_outcome(value: int, cards: [BusCard], drawn_card: BusCard):
+        """
+        Get the question evaluation for the question matching the amount of cards in the hand of a player.
+
+        :param value: the answer of the player
+        :param cards: the cards in the hand of the player before the card was drawn
+        :param drawn_card: the drawn card
+        :return: a tuple (correct, group drink) where group drink indicates that everyone else has to drink if the
+        answer is correct
+        """
+        if len(cards) == 0:
+            return BusGame.get_question_round_question_1_outcome(value, drawn_card), False
+        elif len(cards) == 1:
+            outcome = BusGame.get_question_round_question_2_outcome(value, cards[0], drawn_card)
+            return outcome, outcome and value == BusGame.VALUE_SAME
+        elif len(cards) == 2:
+            outcome = BusGame.get_question_round_question_3_outcome(value, cards[0], cards[1], drawn_card)
+            return outcome, value == BusGame.VALUE_SAME
+        elif len(cards) == 3:
+            outcome = BusGame.get_question_round_question_4_outcome(value, cards, drawn_card)
+            return outcome, value == BusGame.VALUE_SAME
+        else:
+            raise ValueError(f"There is no question for a hand of {len(cards)} cards")
+
+    @staticmethod
+    def get_question_round_player(hand_sizes: [int]):
+        """
+        Get the player that answers the next question of phase 1.
+
+        :param hand_sizes: the amount of cards in the hand of each player, in player order
+        :return: the index of the first player with the least cards, None if all hands are full
+        """
+        player_turn = None
+        least_cards = BusHand.MAX_CARDS_IN_HAND
+        for i in range(0, len(hand_sizes)):
+            if hand_sizes[i] < least_cards:
+                least_cards = hand_sizes[i]
+                player_turn = i
+        return player_turn
+
+    @staticmethod
+    def get_bus_player(hand_sizes: [int]) -> int:
+        """
+        Get the player that has to take the bus.
+
+        :param hand_sizes: the amount of cards in the hand of each player at the end of phase 2, in player order
+        :return: the index of the first player with the most cards
+        """
+        player_lost = 0
+        for i in range(0, len(hand_sizes)):
+            if hand_sizes[player_lost] < hand_sizes[i]:
+                player_lost = i
+        return player_lost
+
+    @property
+    def bus_finished(self) -> bool:
+        """Check if the bus is finished, either because all bus cards were guessed or because the deck is empty."""
+        return self.bus.current_card_index >= self.BUS_CARD_AMOUNT or self.cards_left <= 0
+
     def to_dict(self):
         """Convert to dictionary."""
         return {
@@ -706,13 +1043,24 @@ class BusGame:
         }
 
     @staticmethod
-    def from_dict(dictionary):
-        """Import from dictionary."""
+    def from_dict(dictionary, players: dict = None):
+        """
+        Import from dictionary.
+
+        The owners of all cards in the game are resolved in one query.
+        :param dictionary: the dictionary to import
+        :param players: a dictionary mapping player ids to Player objects, if None all owners are queried at once
+        :return: a BusGame object
+        """
         try:
+            if players is None:
+                players = BusCard.get_owners(
+                    dictionary["deck"] + Pyramid.card_dicts(dictionary["pyramid"]) + dictionary["bus"]["bus"]
+                )
             return BusGame(
-                deck=Deck(cards=[BusCard.from_dict(x) for x in dictionary["deck"]], reshuffle=False),
-                pyramid=Pyramid.from_dict(dictionary["pyramid"]),
-                bus=Bus.from_dict(dictionary["bus"]),
+                deck=Deck(cards=[BusCard.from_dict(x, players=players) for x in dictionary["deck"]], reshuffle=False),
+                pyramid=Pyramid.from_dict(dictionary["pyramid"], players=players),
+                bus=Bus.from_dict(dictionary["bus"], players=players),
             )
         except KeyError:
             return BusGame()
@@ -722,10 +1070,63 @@ class BusGame:
         return json.dumps(self.to_dict())
 
     @staticmethod
-    def from_json(json_str):
+    def from_json(json_str, players: dict = None):
         """Import from json."""
         dictionary = json.loads(json_str)
-        return BusGame.from_dict(dictionary)
+        return BusGame.from_dict(dictionary, players=players)
+
+    def encode(self, writer: StateWriter):
+        """Encode to the compact state format, the deck is written as its size followed by the remaining cards."""
+        cards = list(self.deck)
+        writer.write_byte(len(cards))
+        for card in cards:
+            card.encode(writer)
+        self.pyramid.encode(writer)
+        self.bus.encode(writer)
+
+    @staticmethod
+    def decode(reader: StateReader):
+        """Decode from the compact state format."""
+        amount = reader.read_byte()
+        if reader.version == 2:
+            # Skip the deck cursor, which was always 0
+            reader.read_byte()
+        cards = [BusCard.decode(reader) for _ in range(amount)]
+        return BusGame(deck=Deck(cards=cards, reshuffle=False), pyramid=Pyramid.decode(reader), bus=Bus.decode(reader))
+
+    def to_state(self) -> str:
+        """Convert to the compact state format."""
+        writer = StateWriter()
+        self.encode(writer)
+        return writer.to_state()
+
+    @staticmethod
+    def from_state(state: str, players: dict = None):
+        """
+        Import from a state in either the compact or the legacy JSON format.
+
+        :param state: the state to import
+        :param players: a dictionary mapping player ids to the owners of the cards in the state, the owners are
+        looked up in the database if not specified
+        :return: a BusGame object
+        """
+        if is_legacy_state(state):
+            return BusGame.from_json(state, players=players)
+        reader = StateReader(state)
+        reader.players = BusCard.get_players(reader.owner_ids) if players is None else players
+        try:
+            return BusGame.decode(reader)
+        except IndexError:
+            raise StateFormatException("The game state is truncated")
+
+
+# The interned faces of all cards, indexed by card number
+CARD_FACES = tuple(
+    CardFace(suit, rank, suit_index * len(BusGame.RANKS) + rank_index)
+    for suit_index, suit in enumerate(BusGame.SUITS)
+    for rank_index, rank in enumerate(BusGame.RANKS)
+)
+CARD_FACES_BY_NAME = {(face.suit, face.rank): face for face in CARD_FACES}
 
 
 class BusHand:
@@ -735,6 +1136,7 @@ class BusHand:
 
     def __init__(self, preset=None):
         """Initialize BusHand object."""
+        self.changed = False
         self.hand = list() if preset is None else preset
 
     def add_card(self, card):
@@ -743,12 +1145,14 @@ class BusHand:
             return False
         else:
             self.hand.append(card)
+            self.changed = True
             return True
 
     def remove_card(self, card):
         """Remove a card from the bus hand."""
         if card in self.hand:
             self.hand.remove(card)
+            self.changed = True
             return True
         else:
             return False
@@ -756,6 +1160,7 @@ class BusHand:
     def reset(self):
         """Reset hand."""
         self.hand = list()
+        self.changed = True
 
     def copy(self):
         """Copy this object."""
@@ -766,38 +1171,91 @@ class BusHand:
         return {"hand": [x.to_dict() for x in self.hand]}
 
     @staticmethod
-    def from_dict(dictionary):
-        """Import from dictionary."""
-        return BusHand(preset=[BusCard.from_dict(x) for x in dictionary["hand"]])
+    def from_dict(dictionary, players: dict = None):
+        """
+        Import from dictionary.
+
+        :param dictionary: the dictionary to import
+        :param players: a dictionary mapping player ids to Player objects, if None all owners are queried at once
+        :return: a BusHand object
+        """
+        if players is None:
+            players = BusCard.get_owners(dictionary["hand"])
+        return BusHand(preset=[BusCard.from_dict(x, players=players) for x in dictionary["hand"]])
 
     def to_json(self):
         """Convert to json."""
         return json.dumps(self.to_dict())
 
     @staticmethod
-    def from_json(json_str):
+    def from_json(json_str, players: dict = None):
         """Import from json."""
         dictionary = json.loads(json_str)
-        return BusHand.from_dict(dictionary)
+        return BusHand.from_dict(dictionary, players=players)
+
+    def encode(self, writer: StateWriter):
+        """Encode to the compact state format."""
+        writer.write_byte(len(self.hand))
+        for card in self.hand:
+            card.encode(writer)
+
+    @staticmethod
+    def decode(reader: StateReader):
+        """Decode from the compact state format."""
+        return BusHand(preset=[BusCard.decode(reader) for _ in range(reader.read_byte())])
+
+    def to_state(self) -> str:
+        """Convert to the compact state format."""
+        writer = StateWriter()
+        self.encode(writer)
+        return writer.to_state()
+
+    @staticmethod
+    def from_state(state: str, players: dict = None):
+        """
+        Import from a state in either the compact or the legacy JSON format.
+
+        :param state: the state to import
+        :param players: a dictionary mapping player ids to the owners of the cards in the state, the owners are
+        looked up in the database if not specified
+        :return: a BusHand object
+        """
+        if is_legacy_state(state):
+            return BusHand.from_json(state, players=players)
+        reader = StateReader(state)
+        reader.players = BusCard.get_players(reader.owner_ids) if players is None else players
+        try:
+            return BusHand.decode(reader)
+        except IndexError:
+            raise StateFormatException("The hand state is truncated")
+
 
+def get_orphan_games():
+    """
+    Get all bussen games that do not have a corresponding room.
 
-def execute_data_minimisation(dry_run=False):
+    :return: a queryset of BusGameModel objects without a room
+    """
+    content_type = ContentType.objects.get_for_model(bussen.models.BusGameModel)
+    rooms = Room.objects.filter(content_type=content_type, object_id=OuterRef("pk"))
+    return bussen.models.BusGameModel.objects.filter(~Exists(rooms))
+
+
+def execute_data_minimisation(dry_run=False, batch_size=DATA_MINIMISATION_BATCH_SIZE, limit=None):
     """
     Remove all bussen models that don't have a corrsponding room.
 
-    :param dry_run: does not really remove data if True
-    :return: list of objects removed
+    :param dry_run: does not really remove data if True, only counts the games that would be removed
+    :param batch_size: the maximum amount of games removed per query
+    :param limit: the maximum amount of games to remove, None to remove all
+    :return: a dictionary with the amount of games removed
     """
-    deleted_games = list()
-    bussen_games = bussen.models.BusGameModel.objects.all()
-    for game in bussen_games:
-        try:
-            game.room
-        except bussen.models.NoRoomForGameException:
-            deleted_games.append(game)
+    games = get_orphan_games()
+    if dry_run:
+        return {"games": games.count()}
 
-    if not dry_run:
-        for game in deleted_games:
-            game.delete()
+    def invalidate(primary_keys):
+        for primary_key in primary_keys:
+            game_cache.invalidate(primary_key)
 
-    return [deleted_games]
+    return {"games": delete_in_batches(games, batch_size=batch_size, limit=limit, callback=invalidate)}
@@ -0,0 +1,297 @@
+"""
+Headless simulation of bussen games.
+
+Complete games are played by simulated players with the game rules of BusGame, Pyramid, Bus and BusHand, without
+models, database or websockets, so that changes to the game engine can be measured in isolation.
+"""
+import random
+import time
+
+from .services import BusCard, BusGame, BusHand
+
+
+class RandomStrategy:
+    """Strategy of a player that answers, calls and guesses at random and sometimes places a non matching card."""
+
+    def __init__(self, rng: random.Random, bluff_chance: float = 0.2, call_chance: float = 0.5):
+        """
+        Initialize a RandomStrategy object.
+
+        :param rng: the random number generator to make choices with
+        :param bluff_chance: the chance that a player places a card that does not match the pyramid card
+        :param call_chance: the chance that a player calls a card on the pyramid
+        """
+        self.random = rng
+        self.bluff_chance = bluff_chance
+        self.call_chance = call_chance
+
+    def answer(self, cards: [BusCard]) -> int:
+        """Answer the phase 1 question for a hand of cards."""
+        question = BusGame.get_question_round_question(len(cards))
+        return self.random.choice(question["answers"])["value"]
+
+    def cards_to_place(self, cards: [BusCard], pyramid_card: BusCard) -> [BusCard]:
+        """Choose the cards of a hand to place on a pyramid card."""
+        placed = [x for x in cards if x.rank == pyramid_card.rank]
+        others = [x for x in cards if x.rank != pyramid_card.rank]
+        if len(others) > 0 and self.random.random() < self.bluff_chance:
+            placed.append(self.random.choice(others))
+        return placed
+
+    def call(self, card: BusCard) -> bool:
+        """Choose whether to call a card on the pyramid."""
+        return self.random.random() < self.call_chance
+
+    def guess(self, current_card: BusCard) -> str:
+        """Guess the next card of the bus."""
+        return self.random.choice(["higher", "lower", "same"])
+
+
+class ScriptedStrategy:
+    """Deterministic strategy of a player that plays the odds, never bluffs and calls every card."""
+
+    MIDDLE_RANK = 8
+
+    def answer(self, cards: [BusCard]) -> int:
+        """Answer the phase 1 question for a hand of cards."""
+        if len(cards) == 0:
+            return BusGame.VALUE_RED
+        elif len(cards) == 1:
+            return BusGame.VALUE_HIGHER if cards[0].to_int() <= self.MIDDLE_RANK else BusGame.VALUE_LOWER
+        elif len(cards) == 2:
+            return BusGame.VALUE_OUTSIDE
+        else:
+            return BusGame.VALUE_HAVE_SUIT
+
+    def cards_to_place(self, cards: [BusCard], pyramid_card: BusCard) -> [BusCard]:
+        """Choose the cards of a hand to place on a pyramid card."""
+        return [x for x in cards if x.rank == pyramid_card.rank]
+
+    def call(self, card: BusCard) -> bool:
+        """Choose whether to call a card on the pyramid."""
+        return True
+
+    def guess(self, current_card: BusCard) -> str:
+        """Guess the next card of the bus."""
+        return "higher" if current_card.to_int() <= self.MIDDLE_RANK else "lower"
+
+
+STRATEGIES = ["random", "scripted", "mixed"]
+
+
+class SimulatedPlayer:
+    """A simulated player, standing in for a Player as the owner of cards."""
+
+    def __init__(self, player_id: int, strategy):
+        """
+        Initialize a SimulatedPlayer object.
+
+        :param player_id: the identifier of the player
+        :param strategy: the strategy the player makes its choices with
+        """
+        self.id = player_id
+        self.strategy = strategy
+        self.hand = BusHand()
+
+    def __str__(self):
+        """Convert this object to string."""
+        return "Player {}".format(self.id)
+
+
+class GameSimulator:
+    """
+    Plays complete games of bussen with simulated players.
+
+    The time spent in the game engine is recorded per operation. Decks are shuffled with the random module, seed it
+    for reproducible games.
+    """
+
+    def __init__(self, players: [SimulatedPlayer], serialize: bool = False):
+        """
+        Initialize a GameSimulator object.
+
+        :param players: the players to play the games with
+        :param serialize: export and import the game and the changed hands after every move, like the models do when
+        they are saved and loaded
+        """
+        if not 1 < len(players) <= BusGame.MAXIMUM_AMOUNT_OF_PLAYERS:
+            raise ValueError(
+                "A game is played with 2 up to and including {} players".format(BusGame.MAXIMUM_AMOUNT_OF_PLAYERS)
+            )
+        self.players = players
+        self.players_by_id = {player.id: player for player in players}
+        self.serialize = serialize
+        self.game = None
+        self.timings = dict()
+
+    def measure(self, operation: str, function, *args):
+        """
+        Call a function and record its duration.
+
+        :param operation: the name of the operation to record the duration under
+        :param function: the function to call
+        :param args: the arguments to call the function with
+        :return: the return value of the function
+        """
+        start = time.perf_counter()
+        result = function(*args)
+        duration = time.perf_counter() - start
+        timing = self.timings.setdefault(operation, [0, 0.0])
+        timing[0] += 1
+        timing[1] += duration
+        return result
+
+    def play(self) -> dict:
+        """
+        Play a complete game.
+
+        :return: a dictionary with the player that took the bus and the amount of bus guesses
+        """
+        for player in self.players:
+            player.hand.reset()
+        self.game = self.measure("new_game", BusGame)
+        self.play_phase_1()
+        self.play_phase_2()
+        bus_player, guesses = self.play_phase_3()
+        return {"bus_player": bus_player, "guesses": guesses}
+
+    def play_phase_1(self):
+        """Let the players answer questions until all hands are full."""
+        while True:
+            player_turn = BusGame.get_question_round_player([len(player.hand.hand) for player in self.players])
+            if player_turn is None:
+                break
+            player = self.players[player_turn]
+            value = player.strategy.answer(list(player.hand.hand))
+            self.measure("answer", self.answer, player, value)
+            self.store()
+
+    def play_phase_2(self):
+        """Let the players place and call cards on every pyramid card."""
+        self.measure("set_pyramid", self.game.set_pyramid)
+        self.store()
+        while self.measure("next_pyramid_card", self.game.pyramid.set_next_pyramid_card):
+            pyramid_card = self.game.pyramid.current_card()
+            for player in self.players:
+                for card in player.strategy.cards_to_place(list(player.hand.hand), pyramid_card):
+                    self.measure("place_card", self.place_card, player, card)
+            for card in list(self.game.pyramid.cards_on_pyramid):
+                caller = self.players[(self.players.index(card.owner) + 1) % len(self.players)]
+                if caller.strategy.call(card):
+                    self.measure("call_card", self.call_card, card.random_id)
+            self.store()
+
+    def play_phase_3(self):
+        """
+        Let the player with the most cards take the bus.
+
+        :return: a tuple (the player that took the bus, the amount of guesses)
+        """
+        bus_player = self.players[BusGame.get_bus_player([len(player.hand.hand) for player in self.players])]
+        for player in self.players:
+            player.hand.reset()
+        self.measure("reset_deck", self.game.reset_deck)
+        self.measure("set_bus", self.game.set_bus)
+        self.store()
+        guesses = 0
+        while not self.game.bus_finished:
+            guess = bus_player.strategy.guess(self.game.bus.current_card())
+            self.measure("guess", self.guess, guess)
+            self.store()
+            guesses += 1
+        return bus_player, guesses
+
+    def answer(self, player: SimulatedPlayer, value: int):
+        """Draw a card for a phase 1 answer of a player and evaluate it."""
+        drawn_card = self.game.draw_card()
+        cards = list(player.hand.hand)
+        player.hand.add_card(drawn_card)
+        return BusGame.get_question_round_outcome(value, cards, drawn_card)
+
+    def place_card(self, player: SimulatedPlayer, card: BusCard) -> bool:
+        """Move a card from the hand of a player to the pyramid."""
+        if self.game.pyramid.can_add_cards() and player.hand.remove_card(card):
+            placed_card = BusCard(card.suit, card.rank)
+            placed_card.owner = player
+            self.game.pyramid.add_card_to_pyramid(placed_card)
+            return True
+        else:
+            return False
+
+    def call_card(self, random_id: str):
+        """Call a card on the pyramid, a card that does not match is returned to the hand of its owner."""
+        card = self.game.pyramid.remove_card_in_pyramid_list(random_id)
+        if card is not None:
+            if card.owner is not None:
+                card.owner.hand.add_card(card)
+            return True, card.owner
+        else:
+            return False, self.game.pyramid.owner_of_id(random_id)
+
+    def guess(self, guess: str) -> bool:
+        """Draw a card for a bus guess and evaluate it."""
+        return self.game.bus.guess_card(guess, self.game.draw_card())
+
+    def store(self):
+        """Finish a move, exporting and importing the game and the changed hands if serialize is set."""
+        if self.serialize:
+            state = self.measure("game_to_state", self.game.to_state)
+            self.game = self.measure("game_from_state", BusGame.from_state, state, self.players_by_id)
+            for player in self.players:
+                if player.hand.changed:
+                    state = self.measure("hand_to_state", player.hand.to_state)
+                    player.hand = self.measure("hand_from_state", BusHand.from_state, state, self.players_by_id)
+        self.game.clear_journal()
+        for player in self.players:
+            player.hand.changed = False
+
+
+def create_players(amount: int, strategy: str = "random", seed: int = None) -> [SimulatedPlayer]:
+    """
+    Create simulated players.
+
+    :param amount: the amount of players
+    :param strategy: "random", "scripted" or "mixed" for alternating random and scripted players
+    :param seed: the seed for the choices of random players
+    :return: a list of SimulatedPlayer objects
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError("The strategy must be one of {}".format(", ".join(STRATEGIES)))
+    rng = random.Random(seed)
+    players = list()
+    for player_id in range(1, amount + 1):
+        if strategy == "scripted" or (strategy == "mixed" and player_id % 2 == 0):
+            players.append(SimulatedPlayer(player_id, ScriptedStrategy()))
+        else:
+            players.append(SimulatedPlayer(player_id, RandomStrategy(rng)))
+    return players
+
+
+def run_benchmark(games: int, players: int, strategy: str = "random", seed: int = None, serialize: bool = False):
+    """
+    Play games with the simulator and measure the throughput of the game engine.
+
+    :param games: the amount of games to play
+    :param players: the amount of players per game
+    :param strategy: the strategy of the players, see create_players
+    :param seed: seed for the decks and the choices of random players, games are reproducible if set
+    :param serialize: export and import the game and hands after every move
+    :return: a dictionary with the amount of games, the total time, the games per second and per operation the amount
+    of calls, the total time and the mean time in seconds
+    """
+    if seed is not None:
+        random.seed(seed)
+    simulator = GameSimulator(create_players(players, strategy=strategy, seed=seed), serialize=serialize)
+    start = time.perf_counter()
+    for _ in range(games):
+        simulator.play()
+    seconds = time.perf_counter() - start
+    return {
+        "games": games,
+        "seconds": seconds,
+        "games_per_second": games / seconds if seconds > 0 else 0,
+        "operations": {
+            operation: {"count": count, "total": total, "mean": total / count}
+            for operation, (count, total) in simulator.timings.items()
+        },
+    }
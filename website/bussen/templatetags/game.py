@@ -17,9 +17,10 @@ def render_game_cards(context, player, refresh=False):
 
 
 @register.inclusion_tag("bussen/pyramid_header.html", takes_context=True)
-def render_pyramid_header(context, player, refresh=False):
+def render_pyramid_header(context, player, refresh=False, room=None):
     """Render pyramid header."""
-    return {"player": player, "request": context.get("request"), "refresh": refresh, "room": player.room}
+    room = player.room if room is None else room
+    return {"player": player, "request": context.get("request"), "refresh": refresh, "room": room}
 
 
 @register.inclusion_tag("bussen/card.html", takes_context=False)
@@ -46,15 +47,16 @@ def render_pyramid(context, player: Player, refresh=False):
 
 
 @register.inclusion_tag("bussen/bus.html", takes_context=True)
-def render_bus(context, player, refresh=False):
+def render_bus(context, player, refresh=False, room=None):
     """Render order footer."""
+    room = player.room if room is None else room
     return {
         "player": player,
         "request": context.get("request"),
         "refresh": refresh,
-        "bus": player.room.game.game.bus.bus,
-        "current_card": player.room.game.game.bus.current_card(),
-        "room": player.room,
+        "bus": room.game.game.bus.bus,
+        "current_card": room.game.game.bus.current_card(),
+        "room": room,
     }
 
 
@@ -70,22 +72,26 @@ def render_player_hand(context, player, refresh=False):
 
 
 @register.inclusion_tag("bussen/player_question.html", takes_context=True)
-def render_player_question(context, player, refresh=False):
+def render_player_question(context, player, refresh=False, room=None):
     """Render order footer."""
-    if player.room.game.phase != BusGameModel.PHASE_1:
+    room = player.room if room is None else room
+    if room.game.phase != BusGameModel.PHASE_1:
         return {
             "player": player,
             "request": context.get("request"),
             "refresh": refresh,
+            "room": room,
             "display": False,
         }
-    elif player == player.room.game.current_player:
+    elif player is not None and player == room.game.current_player:
+        question = room.game.get_card_question(player)
         return {
             "player": player,
             "request": context.get("request"),
             "refresh": refresh,
-            "question": player.room.game.get_card_question(player)["question"],
-            "answers": player.room.game.get_card_question(player)["answers"],
+            "room": room,
+            "question": question["question"],
+            "answers": question["answers"],
             "display": True,
         }
     else:
@@ -93,6 +99,7 @@ def render_player_question(context, player, refresh=False):
             "player": player,
             "request": context.get("request"),
             "refresh": refresh,
+            "room": room,
             "question": None,
             "answers": [],
             "display": True,
@@ -2,6 +2,7 @@ from django.http import Http404, JsonResponse
 from django.shortcuts import render, redirect
 from django.template.loader import get_template
 from django.views.generic import TemplateView
+from games.profiling import ProfiledViewMixin
 from .models import BusGameModel
 from rooms.services import get_player_from_request
 from .templatetags.game import (
@@ -127,7 +128,7 @@ class GamePhase3View(TemplateView):
             return render(request, self.template_name, {"game": room.game, "player": player})
 
 
-class CardRefreshView(TemplateView):
+class CardRefreshView(ProfiledViewMixin, TemplateView):
     """Refresh the Player cards view."""
 
     template_name = "bussen/player_cards.html"
@@ -150,7 +151,7 @@ class CardRefreshView(TemplateView):
         return JsonResponse({"data": cards})
 
 
-class QuestionRefreshView(TemplateView):
+class QuestionRefreshView(ProfiledViewMixin, TemplateView):
     """Refresh the Player question view."""
 
     template_name = "bussen/player_question.html"
@@ -175,7 +176,7 @@ class QuestionRefreshView(TemplateView):
         return JsonResponse({"data": question})
 
 
-class PyramidRefreshView(TemplateView):
+class PyramidRefreshView(ProfiledViewMixin, TemplateView):
     """Refresh the Player pyramid view."""
 
     template_name = "bussen/pyramid.html"
@@ -204,7 +205,7 @@ class PyramidRefreshView(TemplateView):
         return JsonResponse({"data": pyramid})
 
 
-class PlayerHandRefreshView(TemplateView):
+class PlayerHandRefreshView(ProfiledViewMixin, TemplateView):
     """Refresh the Player hand view."""
 
     template_name = "bussen/hand.html"
@@ -227,7 +228,7 @@ class PlayerHandRefreshView(TemplateView):
         return JsonResponse({"data": hand})
 
 
-class PyramidHeaderRefreshView(TemplateView):
+class PyramidHeaderRefreshView(ProfiledViewMixin, TemplateView):
     """Refresh the Pyramid header view."""
 
     template_name = "bussen/pyramid_header.html"
@@ -258,7 +259,7 @@ class PyramidHeaderRefreshView(TemplateView):
         return JsonResponse({"data": hand})
 
 
-class BusRefreshView(TemplateView):
+class BusRefreshView(ProfiledViewMixin, TemplateView):
     """Refresh the bus view."""
 
     template_name = "bussen/bus.html"
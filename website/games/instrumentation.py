@@ -0,0 +1,251 @@
+"""
+Instrumentation of websocket messages.
+
+The handling of every websocket message is measured: the amount of database queries, the time spent in the database,
+in (de)serializing game states, in sending to the channel layer and in the game, and the total time. Measurements are
+aggregated per message type over a rolling window in each process. Processes publish their aggregate to a file in a
+shared directory from which it can be read by the dumpinstrumentation command.
+"""
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+TIMERS = ["db", "serialization", "send", "game"]
+
+
+class Measurement:
+    """Measurement of the handling of a single message."""
+
+    def __init__(self, key: str = None):
+        """
+        Initialize a Measurement object.
+
+        :param key: the type of the message, for example "phase1/answer" or "ping"
+        """
+        self.key = key
+        self.queries = 0
+        self.timings = dict()
+
+    def add(self, timer: str, seconds: float):
+        """Add time to a timer."""
+        self.timings[timer] = self.timings.get(timer, 0) + seconds
+
+
+class Instrumentation:
+    """
+    Process-local aggregate of message measurements.
+
+    Measurements are added to buckets of bucket_size seconds, buckets older than the window are dropped. The aggregate
+    is written to the publish directory at most once per publish interval.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        window: float = 300,
+        bucket_size: float = 60,
+        publish_interval: float = 10,
+        directory: str = None,
+    ):
+        """
+        Initialize an Instrumentation object.
+
+        :param enabled: whether messages are measured
+        :param window: the amount of seconds of measurements kept in the aggregate
+        :param bucket_size: the amount of seconds of measurements per bucket
+        :param publish_interval: the minimum amount of seconds between two publications of the aggregate
+        :param directory: the directory to publish the aggregate in, None to not publish
+        """
+        self.enabled = enabled
+        self.window = window
+        self.bucket_size = bucket_size
+        self.publish_interval = publish_interval
+        self.directory = directory
+        self._buckets = dict()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._last_publish = time.monotonic()
+
+    @property
+    def current(self):
+        """Get the measurement of the message handled by this thread, None if no message is measured."""
+        return getattr(self._local, "measurement", None)
+
+    @contextmanager
+    def measure(self, key: str = None):
+        """
+        Measure the handling of a message in this thread.
+
+        The key of the yielded Measurement can be set once the type of the message is known. Measurements nested in
+        another measurement are not recorded separately.
+        :param key: the type of the message
+        :return: a context manager yielding a Measurement
+        """
+        measurement = Measurement(key)
+        if not self.enabled or self.current is not None:
+            yield measurement
+            return
+        self._local.measurement = measurement
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(self._execute_wrapper):
+                yield measurement
+        finally:
+            total = time.perf_counter() - start
+            self._local.measurement = None
+            self.record(measurement, total)
+
+    @contextmanager
+    def timer(self, name: str):
+        """
+        Time a part of the handling of the message measured in this thread.
+
+        :param name: the name of the timer, one of TIMERS
+        :return: a context manager, does nothing if no message is measured
+        """
+        measurement = self.current
+        if measurement is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            measurement.add(name, time.perf_counter() - start)
+
+    def _execute_wrapper(self, execute, sql, params, many, context):
+        """Count and time a database query of the measured message."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            measurement = self.current
+            if measurement is not None:
+                measurement.queries += 1
+                measurement.add("db", time.perf_counter() - start)
+
+    def record(self, measurement: Measurement, total: float):
+        """
+        Add a measurement to the aggregate and publish the aggregate if the publish interval has passed.
+
+        :param measurement: the measurement
+        :param total: the total time of handling the message in seconds
+        :return: None
+        """
+        key = measurement.key if measurement.key is not None else "unknown"
+        bucket_index = int(time.time() // self.bucket_size)
+        with self._lock:
+            if bucket_index not in self._buckets:
+                oldest = bucket_index - int(self.window // self.bucket_size)
+                self._buckets = {index: x for index, x in self._buckets.items() if index > oldest}
+                self._buckets[bucket_index] = dict()
+            statistics = self._buckets[bucket_index].setdefault(key, self.empty_statistics())
+            self.add_statistics(
+                statistics,
+                {"count": 1, "queries": measurement.queries, "total": total, "max": total, **measurement.timings},
+            )
+            publish = self.directory is not None and time.monotonic() - self._last_publish >= self.publish_interval
+            if publish:
+                self._last_publish = time.monotonic()
+        if publish:
+            self.publish()
+
+    @staticmethod
+    def empty_statistics() -> dict:
+        """Get the statistics of no messages."""
+        return {"count": 0, "queries": 0, "total": 0, "max": 0, **{timer: 0 for timer in TIMERS}}
+
+    @staticmethod
+    def add_statistics(statistics: dict, other: dict):
+        """Add statistics to other statistics in place."""
+        for name, value in other.items():
+            if name == "max":
+                statistics[name] = max(statistics.get(name, 0), value)
+            else:
+                statistics[name] = statistics.get(name, 0) + value
+
+    def snapshot(self) -> dict:
+        """
+        Get the aggregate of the window.
+
+        :return: a dictionary mapping message types to statistics with the amount of messages and queries and the sum
+        of the total time and of every timer in seconds and the maximum total time
+        """
+        oldest = int(time.time() // self.bucket_size) - int(self.window // self.bucket_size)
+        aggregate = dict()
+        with self._lock:
+            for index, bucket in self._buckets.items():
+                if index > oldest:
+                    for key, statistics in bucket.items():
+                        self.add_statistics(aggregate.setdefault(key, self.empty_statistics()), statistics)
+        return aggregate
+
+    def publish(self):
+        """Write the aggregate of this process to a file in the publish directory."""
+        self._last_publish = time.monotonic()
+        path = os.path.join(self.directory, "{}-{}.json".format(socket.gethostname(), os.getpid()))
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path + ".tmp", "w") as file:
+                json.dump(
+                    {"process": os.path.basename(path)[:-5], "time": time.time(), "messages": self.snapshot()}, file
+                )
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            logging.warning("Could not publish instrumentation to {}: {}".format(path, e))
+
+    def clear(self):
+        """Remove all measurements."""
+        with self._lock:
+            self._buckets = dict()
+
+
+def read_published(directory: str, max_age: float = None) -> list:
+    """
+    Read the aggregates published by all processes.
+
+    :param directory: the publish directory
+    :param max_age: the maximum age in seconds of a publication, older publications are skipped
+    :return: a list of dictionaries with the process, the time of publication and the aggregate of messages
+    """
+    publications = list()
+    if not os.path.isdir(directory):
+        return publications
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as file:
+                publication = json.load(file)
+        except (OSError, ValueError):
+            continue
+        if max_age is None or time.time() - publication["time"] <= max_age:
+            publications.append(publication)
+    return publications
+
+
+def merge(aggregates: [dict]) -> dict:
+    """Merge the aggregates of multiple processes."""
+    merged = dict()
+    for aggregate in aggregates:
+        for key, statistics in aggregate.items():
+            Instrumentation.add_statistics(merged.setdefault(key, Instrumentation.empty_statistics()), statistics)
+    return merged
+
+
+instrumentation = Instrumentation(
+    enabled=getattr(settings, "GAMES_INSTRUMENTATION", True),
+    window=getattr(settings, "GAMES_INSTRUMENTATION_WINDOW", 300),
+    publish_interval=getattr(settings, "GAMES_INSTRUMENTATION_PUBLISH_INTERVAL", 10),
+    directory=getattr(
+        settings, "GAMES_INSTRUMENTATION_DIRECTORY", os.path.join(tempfile.gettempdir(), "games-instrumentation")
+    ),
+)
@@ -1,4 +1,5 @@
 import logging
+import time
 
 from django.core.management import BaseCommand
 
@@ -14,13 +15,31 @@ class Command(BaseCommand):
         parser.add_argument(
             "--dry-run", action="store_true", dest="dry-run", default=False, help="Dry run instead of saving data",
         )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            dest="batch-size",
+            default=rooms.services.DATA_MINIMISATION_BATCH_SIZE,
+            help="Amount of objects removed per query",
+        )
 
     def handle(self, *args, **options):
         """Execute the command."""
-        deleted_objects = rooms.services.execute_data_minimisation(options["dry-run"])
-        for d in deleted_objects:
-            logging.info("Removed {}".format(d))
+        start = time.monotonic()
+        removed = rooms.services.execute_data_minimisation(options["dry-run"], batch_size=options["batch-size"])
+        logging.info(
+            "{} {} rooms and {} players in {:.2f} seconds".format(
+                "Would remove" if options["dry-run"] else "Removed",
+                removed["rooms"],
+                removed["players"],
+                time.monotonic() - start,
+            )
+        )
 
-        deleted_objects = bussen.services.execute_data_minimisation(options["dry-run"])
-        for d in deleted_objects:
-            logging.info("Removed {}".format(d))
+        start = time.monotonic()
+        removed = bussen.services.execute_data_minimisation(options["dry-run"], batch_size=options["batch-size"])
+        logging.info(
+            "{} {} bussen games in {:.2f} seconds".format(
+                "Would remove" if options["dry-run"] else "Removed", removed["games"], time.monotonic() - start,
+            )
+        )
@@ -0,0 +1,46 @@
+import json
+
+from django.core.management import BaseCommand
+
+from games.instrumentation import TIMERS, instrumentation, merge, read_published
+
+
+class Command(BaseCommand):
+    """Command to dump the websocket message measurements published by all processes."""
+
+    def add_arguments(self, parser):
+        """Arguments for the command."""
+        parser.add_argument(
+            "--max-age",
+            type=float,
+            dest="max-age",
+            default=instrumentation.window,
+            help="Skip processes that did not publish measurements in the last max-age seconds",
+        )
+        parser.add_argument(
+            "--json", action="store_true", dest="json", default=False, help="Write the aggregate as JSON",
+        )
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        publications = read_published(instrumentation.directory, max_age=options["max-age"])
+        aggregate = merge([publication["messages"] for publication in publications])
+        if options["json"]:
+            self.stdout.write(json.dumps({"processes": len(publications), "messages": aggregate}, indent=2))
+            return
+
+        self.stdout.write(
+            "Messages of the last {} seconds of {} processes".format(instrumentation.window, len(publications))
+        )
+        self.stdout.write(
+            "{:<20}{:>9}{:>9}".format("message", "count", "queries")
+            + "".join("{:>18}".format(timer + " ms") for timer in TIMERS)
+            + "{:>12}{:>12}".format("total ms", "max ms")
+        )
+        for key, statistics in sorted(aggregate.items(), key=lambda x: x[1]["total"], reverse=True):
+            count = statistics["count"]
+            self.stdout.write(
+                "{:<20}{:>9}{:>9.1f}".format(key, count, statistics["queries"] / count)
+                + "".join("{:>18.2f}".format(statistics[timer] / count * 1000) for timer in TIMERS)
+                + "{:>12.2f}{:>12.2f}".format(statistics["total"] / count * 1000, statistics["max"] * 1000)
+            )
@@ -0,0 +1,86 @@
+import io
+import os
+import pstats
+
+from django.core.management import BaseCommand, CommandError
+
+from games.profiling import list_profiles, profiler, read_control, write_control
+
+
+class Command(BaseCommand):
+    """Command to switch the sampled profiler of all processes and to show the profiles they dumped."""
+
+    ACTIONS = ["on", "off", "status", "show", "clear"]
+
+    def add_arguments(self, parser):
+        """Arguments for the command."""
+        parser.add_argument(
+            "action",
+            choices=self.ACTIONS,
+            help="Switch profiling on or off, show the status, show the profiles or remove the profiles",
+        )
+        parser.add_argument(
+            "--sample-rate",
+            type=int,
+            dest="sample-rate",
+            default=None,
+            help="Profile 1 in sample-rate messages and requests (with on)",
+        )
+        parser.add_argument(
+            "--key", dest="key", default=None, help="Only show the profiles of keys containing this text (with show)",
+        )
+        parser.add_argument(
+            "--sort", dest="sort", default="cumulative", help="Sort key of the profile statistics (with show)",
+        )
+        parser.add_argument(
+            "--limit", type=int, dest="limit", default=25, help="Amount of functions to show per profile (with show)",
+        )
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        directory = profiler.directory
+        if directory is None:
+            raise CommandError("No profile directory is configured")
+        if options["sample-rate"] is not None and options["sample-rate"] < 1:
+            raise CommandError("The sample rate must be at least 1")
+
+        action = options["action"]
+        if action in ("on", "off"):
+            write_control(directory, enabled=action == "on", sample_rate=options["sample-rate"])
+            self.stdout.write(
+                "Profiling switched {}, processes apply this within {} seconds".format(
+                    action, profiler.CONTROL_INTERVAL
+                )
+            )
+        elif action == "clear":
+            write_control(directory, reset=True)
+            removed = 0
+            for paths in list_profiles(directory).values():
+                for path in paths:
+                    os.remove(path)
+                    removed += 1
+            self.stdout.write("Removed {} profiles".format(removed))
+        elif action == "status":
+            control = read_control(directory)
+            self.stdout.write(
+                "Profiling is {} (1 in {} calls), profiles are written to {}".format(
+                    "on" if control.get("enabled", profiler.default_enabled) else "off",
+                    control.get("sample_rate", profiler.default_sample_rate),
+                    directory,
+                )
+            )
+            for key, paths in list_profiles(directory).items():
+                self.stdout.write("{:<50}{:>4} processes".format(key, len(paths)))
+        else:
+            self.show(directory, options)
+
+    def show(self, directory, options):
+        """Write the statistics of the profiles of all processes, merged per key."""
+        for key, paths in list_profiles(directory).items():
+            if options["key"] is not None and options["key"] not in key:
+                continue
+            stream = io.StringIO()
+            stats = pstats.Stats(*paths, stream=stream)
+            stats.sort_stats(options["sort"]).print_stats(options["limit"])
+            self.stdout.write("=== {} ({} processes)".format(key, len(paths)))
+            self.stdout.write(stream.getvalue())
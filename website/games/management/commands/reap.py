@@ -0,0 +1,65 @@
+import time
+
+from django.core.management import BaseCommand
+
+import rooms.services
+import bussen.services
+
+
+class Command(BaseCommand):
+    """Command to incrementally remove stale rooms, offline players and orphaned games in bounded batches."""
+
+    def add_arguments(self, parser):
+        """Arguments for the command."""
+        parser.add_argument(
+            "--limit",
+            type=int,
+            dest="limit",
+            default=500,
+            help="Maximum amount of rooms, players and games each removed per run",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, dest="batch-size", default=100, help="Amount of objects removed per query",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            dest="interval",
+            default=None,
+            help="Keep running and start a new run every interval seconds instead of running once",
+        )
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        while True:
+            start = time.monotonic()
+            removed, backlog = self.reap(options["limit"], options["batch-size"])
+            self.stdout.write(
+                "Removed {} in {:.2f} seconds, backlog {}".format(
+                    self.format_counts(removed), time.monotonic() - start, self.format_counts(backlog)
+                )
+            )
+            if options["interval"] is None:
+                break
+            time.sleep(options["interval"])
+
+    @staticmethod
+    def reap(limit, batch_size):
+        """
+        Remove a bounded amount of stale objects.
+
+        :param limit: the maximum amount of objects to remove per kind of object
+        :param batch_size: the maximum amount of objects removed per query
+        :return: a tuple (dictionary with the amount of removed objects, dictionary with the amount of stale objects
+        left after this run)
+        """
+        removed = rooms.services.execute_data_minimisation(batch_size=batch_size, limit=limit)
+        removed.update(bussen.services.execute_data_minimisation(batch_size=batch_size, limit=limit))
+        backlog = rooms.services.execute_data_minimisation(dry_run=True)
+        backlog.update(bussen.services.execute_data_minimisation(dry_run=True))
+        return removed, backlog
+
+    @staticmethod
+    def format_counts(counts):
+        """Format a dictionary of object counts."""
+        return ", ".join("{} {}".format(amount, name) for name, amount in counts.items())
@@ -0,0 +1,28 @@
+from django.core.management import BaseCommand, CommandError
+
+from rooms.models import Player
+from rooms.tokens import revoke_tokens
+
+
+class Command(BaseCommand):
+    """Command to revoke all player tokens issued to players up until now."""
+
+    def add_arguments(self, parser):
+        """Arguments for the command."""
+        parser.add_argument("players", type=int, nargs="*", help="Ids of the players to revoke the tokens of")
+        parser.add_argument(
+            "--room", dest="room", default=None, help="Revoke the tokens of all players in the room with this slug",
+        )
+
+    def handle(self, *args, **options):
+        """Execute the command."""
+        if not options["players"] and options["room"] is None:
+            raise CommandError("Specify players or a room")
+        players = Player.objects.filter(id__in=options["players"])
+        if options["room"] is not None:
+            players = players | Player.objects.filter(room__slug=options["room"])
+        revoked = 0
+        for player_id in players.values_list("id", flat=True):
+            revoke_tokens(player_id)
+            revoked += 1
+        self.stdout.write("Revoked the tokens of {} players".format(revoked))
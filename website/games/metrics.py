@@ -0,0 +1,206 @@
+"""
+Process-local metrics of rooms, websockets and the channel layer.
+
+Counters and histograms are kept in memory and updated under a lock, so that they can be shared by the threads of a
+daphne process. They are exposed per process by the metrics view, either in the Prometheus text format or as JSON.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5]
+# Names of the label of every counter in the Prometheus text format
+COUNTER_LABELS = {"websocket_messages": "type", "http_requests": "endpoint"}
+
+
+class Histogram:
+    """Cumulative histogram of durations."""
+
+    def __init__(self, buckets: [float]):
+        """
+        Initialize a Histogram object.
+
+        :param buckets: the sorted upper bounds of the buckets in seconds
+        """
+        self.buckets = buckets
+        self.counts = [0 for _ in buckets]
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        """Add a duration to this histogram."""
+        for index, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.sum += seconds
+
+    def to_dict(self) -> dict:
+        """Convert this histogram to a dictionary with cumulative bucket counts, the count and the sum."""
+        cumulative = 0
+        buckets = dict()
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        buckets["+Inf"] = self.count
+        return {"buckets": buckets, "count": self.count, "sum": self.sum}
+
+
+class Metrics:
+    """
+    Counters and histograms of this process.
+
+    Counters keep a total since the start of the process and counts per second of the last window seconds to report
+    the current rate.
+    """
+
+    def __init__(self, enabled: bool = True, window: int = 60, buckets: [float] = None):
+        """
+        Initialize a Metrics object.
+
+        :param enabled: whether metrics are collected
+        :param window: the amount of seconds rates are averaged over
+        :param buckets: the upper bounds of the histogram buckets in seconds, LATENCY_BUCKETS if None
+        """
+        self.enabled = enabled
+        self.window = window
+        self.buckets = buckets if buckets is not None else LATENCY_BUCKETS
+        self._counters = dict()
+        self._seconds = dict()
+        self._histograms = dict()
+        self._lock = threading.Lock()
+
+    def count(self, name: str, label: str):
+        """
+        Increment a counter.
+
+        :param name: the name of the counter, for example "websocket_messages"
+        :param label: the label to count under, for example the type of the message
+        :return: None
+        """
+        if not self.enabled:
+            return
+        second = int(time.time())
+        with self._lock:
+            counter = self._counters.setdefault(name, dict())
+            counter[label] = counter.get(label, 0) + 1
+            if second not in self._seconds:
+                self._seconds = {x: counts for x, counts in self._seconds.items() if x > second - self.window}
+                self._seconds[second] = dict()
+            counts = self._seconds[second]
+            counts[(name, label)] = counts.get((name, label), 0) + 1
+
+    def observe(self, name: str, seconds: float):
+        """
+        Add a duration to a histogram.
+
+        :param name: the name of the histogram, for example "group_send"
+        :param seconds: the duration in seconds
+        :return: None
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        """
+        Add the duration of a block to a histogram.
+
+        :param name: the name of the histogram
+        :return: a context manager
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        """
+        Get the current values of all metrics.
+
+        :return: a dictionary with per counter the totals and the rates per second over the window by label, and per
+        histogram its buckets, count and sum
+        """
+        oldest = int(time.time()) - self.window
+        with self._lock:
+            counters = {
+                name: {"total": dict(counter), "rate": {label: 0.0 for label in counter}}
+                for name, counter in self._counters.items()
+            }
+            for second, counts in self._seconds.items():
+                if second > oldest:
+                    for (name, label), count in counts.items():
+                        counters[name]["rate"][label] += count / self.window
+            histograms = {name: histogram.to_dict() for name, histogram in self._histograms.items()}
+        return {"counters": counters, "histograms": histograms}
+
+    def clear(self):
+        """Reset all metrics."""
+        with self._lock:
+            self._counters = dict()
+            self._seconds = dict()
+            self._histograms = dict()
+
+
+def escape_label(value) -> str:
+    """Escape a label value for the Prometheus text format."""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels: dict) -> str:
+    """Format labels for the Prometheus text format."""
+    if not labels:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(key, escape_label(value)) for key, value in labels.items()) + "}"
+
+
+def render_prometheus(gauges: dict, snapshot: dict, prefix: str = "games", counters: dict = None) -> str:
+    """
+    Render metrics in the Prometheus text format.
+
+    :param gauges: a dictionary mapping gauge names to tuples (help text, list of tuples (labels, value))
+    :param snapshot: a snapshot of a Metrics object, counters are rendered as totals with a _total suffix and labeled
+    as in COUNTER_LABELS
+    :param prefix: the prefix of all metric names
+    :param counters: a dictionary mapping names of counters kept outside of the snapshot to tuples (help text, list of
+    tuples (labels, value)), rendered with a _total suffix
+    :return: the metrics as text
+    """
+    lines = list()
+    for name, (description, samples) in gauges.items():
+        lines.append("# HELP {}_{} {}".format(prefix, name, description))
+        lines.append("# TYPE {}_{} gauge".format(prefix, name))
+        for labels, value in samples:
+            lines.append("{}_{}{} {}".format(prefix, name, format_labels(labels), value))
+    for name, (description, samples) in (counters or dict()).items():
+        lines.append("# HELP {}_{}_total {}".format(prefix, name, description))
+        lines.append("# TYPE {}_{}_total counter".format(prefix, name))
+        for labels, value in samples:
+            lines.append("{}_{}_total{} {}".format(prefix, name, format_labels(labels), value))
+    for name, counter in snapshot["counters"].items():
+        label_name = COUNTER_LABELS.get(name, "type")
+        lines.append("# TYPE {}_{}_total counter".format(prefix, name))
+        for label, value in counter["total"].items():
+            lines.append("{}_{}_total{} {}".format(prefix, name, format_labels({label_name: label}), value))
+    for name, histogram in snapshot["histograms"].items():
+        lines.append("# TYPE {}_{}_seconds histogram".format(prefix, name))
+        for bound, value in histogram["buckets"].items():
+            lines.append("{}_{}_seconds_bucket{} {}".format(prefix, name, format_labels({"le": bound}), value))
+        lines.append("{}_{}_seconds_count {}".format(prefix, name, histogram["count"]))
+        lines.append("{}_{}_seconds_sum {}".format(prefix, name, histogram["sum"]))
+    return "\n".join(lines) + "\n"
+
+
+metrics = Metrics(
+    enabled=getattr(settings, "GAMES_METRICS", True), window=getattr(settings, "GAMES_METRICS_WINDOW", 60),
+)
@@ -0,0 +1,21 @@
+from .metrics import metrics
+
+
+class MetricsMiddleware:
+    """Count requests per endpoint."""
+
+    def __init__(self, get_response):
+        """Initialize MetricsMiddleware."""
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """
+        Count a request under the name of the view it resolved to.
+
+        :param request: the request
+        :return: the response
+        """
+        response = self.get_response(request)
+        match = getattr(request, "resolver_match", None)
+        metrics.count("http_requests", match.view_name if match is not None else "unresolved")
+        return response
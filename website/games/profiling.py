@@ -0,0 +1,231 @@
+"""
+Sampled profiling of websocket messages and refresh views.
+
+When enabled, 1 in sample_rate messages or requests is profiled with cProfile. Profiles are aggregated per message
+type or view in each process and regularly dumped to the profile directory in the pstats format. Profiling is switched
+at runtime by the profiling command, which writes a control file to the profile directory that every process reads.
+"""
+import cProfile
+import json
+import logging
+import os
+import pstats
+import re
+import socket
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+CONTROL_FILE = "control.json"
+
+
+class SampledProfiler:
+    """Process-local profiler of 1 in sample_rate calls."""
+
+    # Minimum amount of seconds between two reads of the control file
+    CONTROL_INTERVAL = 2
+
+    def __init__(
+        self, enabled: bool = False, sample_rate: int = 100, directory: str = None, flush_interval: float = 30,
+    ):
+        """
+        Initialize a SampledProfiler object.
+
+        :param enabled: whether calls are profiled if no control file says otherwise
+        :param sample_rate: profile 1 in sample_rate calls if no control file says otherwise
+        :param directory: the directory profiles are dumped to and the control file is read from
+        :param flush_interval: the minimum amount of seconds between two dumps of the profiles
+        """
+        self.default_enabled = enabled
+        self.default_sample_rate = sample_rate
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._calls = 0
+        self._stats = dict()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._control_mtime = None
+        self._reset = None
+        self._last_control = None
+        self._last_flush = time.monotonic()
+
+    def read_control(self):
+        """Apply the control file if it changed since it was last read, at most once per CONTROL_INTERVAL."""
+        now = time.monotonic()
+        if self.directory is None:
+            return
+        if self._last_control is not None and now - self._last_control < self.CONTROL_INTERVAL:
+            return
+        self._last_control = now
+        path = os.path.join(self.directory, CONTROL_FILE)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._control_mtime:
+            return
+        self._control_mtime = mtime
+        control = read_control(self.directory)
+        enabled = control.get("enabled", self.default_enabled)
+        self.sample_rate = max(1, int(control.get("sample_rate", self.default_sample_rate)))
+        if control.get("reset") != self._reset:
+            self._reset = control.get("reset")
+            self.clear()
+        elif self.enabled and not enabled:
+            self.flush()
+        self.enabled = enabled
+
+    def sample(self) -> bool:
+        """Check if the current call has to be profiled."""
+        self.read_control()
+        if not self.enabled:
+            return False
+        with self._lock:
+            self._calls += 1
+            return self._calls % self.sample_rate == 0
+
+    @contextmanager
+    def profile(self, key: str):
+        """
+        Profile a call if it is sampled.
+
+        Calls nested in a profiled call of the same thread are not sampled separately.
+        :param key: the name the profile is aggregated under, for example "message/phase1/answer"
+        :return: a context manager
+        """
+        if getattr(self._local, "active", False) or not self.sample():
+            yield
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is active in this process
+            yield
+            return
+        self._local.active = True
+        try:
+            yield
+        finally:
+            profiler.disable()
+            self._local.active = False
+            self.add(key, profiler)
+
+    def add(self, key: str, profiler: cProfile.Profile):
+        """Add a profile to the aggregate of a key and dump the aggregates if the flush interval has passed."""
+        profiler.create_stats()
+        with self._lock:
+            if key in self._stats:
+                self._stats[key].add(profiler)
+            else:
+                self._stats[key] = pstats.Stats(profiler)
+            flush = time.monotonic() - self._last_flush >= self.flush_interval
+        if flush:
+            self.flush()
+
+    def flush(self):
+        """Dump the aggregated profiles of this process to the profile directory."""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if self.directory is None:
+                return
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                for key, stats in self._stats.items():
+                    path = os.path.join(self.directory, get_profile_name(key))
+                    stats.dump_stats(path + ".tmp")
+                    os.replace(path + ".tmp", path)
+            except OSError as e:
+                logging.warning("Could not write profiles to {}: {}".format(self.directory, e))
+
+    def clear(self):
+        """Remove the aggregated profiles of this process."""
+        with self._lock:
+            self._stats = dict()
+
+
+def get_profile_name(key: str) -> str:
+    """Get the file name of the profile of a key in this process."""
+    return "{}.{}-{}.prof".format(re.sub(r"[^\w-]", "_", key), socket.gethostname(), os.getpid())
+
+
+def get_profile_key(name: str) -> str:
+    """Get the (sanitized) key of a profile file name."""
+    return name.split(".", 1)[0]
+
+
+def read_control(directory: str) -> dict:
+    """
+    Read the control file of a profile directory.
+
+    :param directory: the profile directory
+    :return: a dictionary with the enabled and sample_rate settings, empty if there is no (valid) control file
+    """
+    try:
+        with open(os.path.join(directory, CONTROL_FILE)) as file:
+            control = json.load(file)
+    except (OSError, ValueError):
+        return dict()
+    return control if isinstance(control, dict) else dict()
+
+
+def write_control(directory: str, enabled: bool = None, sample_rate: int = None, reset: bool = False):
+    """
+    Write the control file of a profile directory, switching profiling for all processes using it.
+
+    :param directory: the profile directory
+    :param enabled: whether calls are profiled, None to keep the current setting
+    :param sample_rate: profile 1 in sample_rate calls, None to keep the current sample rate
+    :param reset: make all processes drop their aggregated profiles
+    :return: None
+    """
+    control = read_control(directory)
+    if enabled is not None:
+        control["enabled"] = enabled
+    if sample_rate is not None:
+        control["sample_rate"] = sample_rate
+    if reset:
+        control["reset"] = time.time()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, CONTROL_FILE)
+    with open(path + ".tmp", "w") as file:
+        json.dump(control, file)
+    os.replace(path + ".tmp", path)
+
+
+def list_profiles(directory: str) -> dict:
+    """
+    List the profiles dumped to a profile directory.
+
+    :param directory: the profile directory
+    :return: a dictionary mapping keys to lists of paths of the profiles of all processes
+    """
+    profiles = dict()
+    if not os.path.isdir(directory):
+        return profiles
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".prof"):
+            profiles.setdefault(get_profile_key(name), list()).append(os.path.join(directory, name))
+    return profiles
+
+
+class ProfiledViewMixin:
+    """Profile sampled requests to a view, aggregated under the name of the view class."""
+
+    def dispatch(self, request, *args, **kwargs):
+        """Dispatch the request, profiling it if it is sampled."""
+        with profiler.profile("view/{}".format(type(self).__name__)):
+            return super().dispatch(request, *args, **kwargs)
+
+
+profiler = SampledProfiler(
+    enabled=getattr(settings, "GAMES_PROFILING", False),
+    sample_rate=getattr(settings, "GAMES_PROFILING_SAMPLE_RATE", 100),
+    directory=getattr(settings, "GAMES_PROFILING_DIRECTORY", os.path.join(tempfile.gettempdir(), "games-profiles")),
+    flush_interval=getattr(settings, "GAMES_PROFILING_FLUSH_INTERVAL", 30),
+)
@@ -1,4 +1,5 @@
 import json
+import logging
 
 
 def decode_message(message):
@@ -11,3 +12,32 @@ def decode_message(message):
             return {}
     else:
         return {}
+
+
+def delete_in_batches(queryset, batch_size=1000, limit=None, callback=None) -> int:
+    """
+    Delete the objects of a queryset in batches.
+
+    The primary keys of every batch are selected with the queryset, so that at most batch_size objects are loaded and
+    deleted at once.
+    :param queryset: the queryset of objects to delete
+    :param batch_size: the maximum amount of objects deleted per query
+    :param limit: the maximum amount of objects to delete in total, None to delete all objects
+    :param callback: a function called with the list of primary keys of every deleted batch
+    :return: the amount of objects deleted, excluding objects deleted by cascading
+    """
+    model = queryset.model
+    deleted = 0
+    while limit is None or deleted < limit:
+        size = batch_size if limit is None else min(batch_size, limit - deleted)
+        primary_keys = list(queryset.values_list("pk", flat=True)[:size])
+        if len(primary_keys) == 0:
+            break
+        model.objects.filter(pk__in=primary_keys).delete()
+        if callback is not None:
+            callback(primary_keys)
+        deleted += len(primary_keys)
+        logging.info("Deleted {} {} objects".format(deleted, model._meta.verbose_name))
+        if len(primary_keys) < size:
+            break
+    return deleted
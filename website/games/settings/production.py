@@ -73,3 +73,13 @@ MEDIA_URL = "/media/"
 CHANNEL_LAYERS = {
     "default": {"BACKEND": "channels_redis.core.RedisChannelLayer", "CONFIG": {"hosts": [("games_redis", 6379)],},},
 }
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "shared": {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "games_cache"},
+}
+
+ROOMS_TOKEN_CACHE = "shared"
+
+GAMES_METRICS_TOKEN = os.environ.get("GAMES_METRICS_TOKEN")
+GAMES_METRICS_REQUIRE_TOKEN = True
@@ -39,6 +39,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "games.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -46,6 +47,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "rooms.middleware.PlayerTokenMiddleware",
 ]
 
 ROOT_URLCONF = "games.urls"
@@ -114,3 +116,53 @@ ASGI_APPLICATION = "games.routing.application"
 CHANNEL_LAYERS = {
     "default": {"BACKEND": "channels_redis.core.RedisChannelLayer", "CONFIG": {"hosts": [("localhost", 6379)],},},
 }
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+}
+
+# Instrumentation
+# Measure websocket messages, aggregated over the last GAMES_INSTRUMENTATION_WINDOW seconds and published every
+# GAMES_INSTRUMENTATION_PUBLISH_INTERVAL seconds to GAMES_INSTRUMENTATION_DIRECTORY (a directory in the temporary
+# directory by default) for the dumpinstrumentation command
+GAMES_INSTRUMENTATION = True
+GAMES_INSTRUMENTATION_WINDOW = 300
+GAMES_INSTRUMENTATION_PUBLISH_INTERVAL = 10
+
+# Metrics
+# Counters and latency histograms of this process exposed at /metrics, rates are averaged over GAMES_METRICS_WINDOW
+# seconds. Set GAMES_METRICS_TOKEN to require it as a bearer token, GAMES_METRICS_REQUIRE_TOKEN hides the metrics if no
+# token is set
+GAMES_METRICS = True
+GAMES_METRICS_WINDOW = 60
+GAMES_METRICS_TOKEN = None
+GAMES_METRICS_REQUIRE_TOKEN = False
+
+# Profiling
+# Profile 1 in GAMES_PROFILING_SAMPLE_RATE websocket messages and refresh requests, dumped every
+# GAMES_PROFILING_FLUSH_INTERVAL seconds to GAMES_PROFILING_DIRECTORY (a directory in the temporary directory by
+# default). Use the profiling command to switch it at runtime
+GAMES_PROFILING = False
+GAMES_PROFILING_SAMPLE_RATE = 100
+GAMES_PROFILING_FLUSH_INTERVAL = 30
+
+# Rooms
+# Either "sync" for the SyncConsumer or "async" for the AsyncConsumer handling room websockets
+ROOMS_CONSUMER = "sync"
+# Heartbeat interval of room websockets in seconds, increased by the interval for every ROOMS_HEARTBEAT_CONNECTIONS
+# connections of a process up to ROOMS_HEARTBEAT_MAX_INTERVAL
+ROOMS_HEARTBEAT_INTERVAL = 5
+ROOMS_HEARTBEAT_MAX_INTERVAL = 30
+ROOMS_HEARTBEAT_CONNECTIONS = 200
+# Seconds after their last interaction that players are online, and the seconds between writing interactions. The
+# flush interval plus ROOMS_HEARTBEAT_MAX_INTERVAL must stay well below the timeout, or connected players are reaped
+ROOMS_PRESENCE_TIMEOUT = 60
+ROOMS_PRESENCE_FLUSH_INTERVAL = 10
+# Cache holding revoked player tokens, must be shared by all processes to revoke tokens everywhere. The local memory
+# cache only suffices for a single process, production uses a database cache (see the revoketokens command)
+ROOMS_TOKEN_CACHE = "default"
+
+# Bussen
+BUSSEN_GAME_CACHE_SIZE = 256
+BUSSEN_GAME_CACHE_TTL = 300
+BUSSEN_SNAPSHOT_INTERVAL = 25
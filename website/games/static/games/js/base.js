@@ -46,6 +46,15 @@ function replace_container(container, data) {
     container.innerHTML = data;
 }
 
+function replace_fragments(fragments) {
+    for (let container_id in fragments) {
+        let container = document.getElementById(container_id);
+        if (container !== null) {
+            replace_container(container, fragments[container_id]);
+        }
+    }
+}
+
 function add_update_list(func, args) {
     update_list.push({func: func, args: args});
 }
@@ -15,11 +15,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from .views import IndexView
+from .views import IndexView, MetricsView
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", IndexView.as_view(), name="index"),
+    path("metrics", MetricsView.as_view(), name="metrics"),
     path("bussen/", include(("bussen.urls", "bussen"), namespace="bussen"),),
     path("rooms/", include(("rooms.urls", "rooms"), namespace="rooms"),),
 ]
@@ -1,5 +1,14 @@
+import json
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
 from django.shortcuts import redirect
-from django.views.generic import TemplateView
+from django.views.generic import TemplateView, View
+
+from bussen.cache import game_cache
+from games.metrics import metrics, render_prometheus
+from rooms.heartbeat import heartbeat
+from rooms.services import get_rooms_by_phase
 
 
 class IndexView(TemplateView):
@@ -17,3 +26,61 @@ class IndexView(TemplateView):
         """
         return redirect("rooms:redirect")
         # return render(request, self.template_name)
+
+
+class MetricsView(View):
+    """
+    Metrics of this process.
+
+    Rendered in the Prometheus text format, or as JSON with ?format=json. If the GAMES_METRICS_TOKEN setting is set,
+    requests must pass it as a bearer token. If GAMES_METRICS_REQUIRE_TOKEN is set, metrics are not available without
+    a token.
+    """
+
+    def get(self, request, **kwargs):
+        """
+        GET request for MetricsView.
+
+        :param request: the request
+        :param kwargs: keyword arguments
+        :return: the metrics, a 404 if metrics are disabled or no token is set while required, or a 403 if the token is
+        missing
+        """
+        token = getattr(settings, "GAMES_METRICS_TOKEN", None)
+        if not metrics.enabled or (token is None and getattr(settings, "GAMES_METRICS_REQUIRE_TOKEN", False)):
+            raise Http404()
+        if token is not None and request.META.get("HTTP_AUTHORIZATION") != "Bearer {}".format(token):
+            return HttpResponseForbidden()
+
+        rooms = get_rooms_by_phase()
+        cache = game_cache.stats()
+        snapshot = metrics.snapshot()
+        if request.GET.get("format") == "json":
+            data = {
+                "rooms": [{"game": game, "phase": phase, "count": count} for game, phase, count in rooms],
+                "websocket_connections": heartbeat.connections,
+                "game_cache": cache,
+                **snapshot,
+            }
+            return HttpResponse(json.dumps(data), content_type="application/json")
+
+        gauges = {
+            "rooms": (
+                "Amount of rooms by game and phase",
+                [
+                    ({"game": game or "none", "phase": "none" if phase is None else phase}, count)
+                    for game, phase, count in rooms
+                ],
+            ),
+            "websocket_connections": ("Amount of connected websockets", [({}, heartbeat.connections)]),
+        }
+        for key in ("size", "hit_rate"):
+            description = "Game state cache {}".format(key.replace("_", " "))
+            gauges["game_cache_{}".format(key)] = (description, [({}, cache[key])])
+        counters = {
+            "game_cache_{}".format(key): ("Game state cache {}".format(key), [({}, cache[key])])
+            for key in ("hits", "misses", "evictions")
+        }
+        return HttpResponse(
+            render_prometheus(gauges, snapshot, counters=counters), content_type="text/plain; version=0.0.4"
+        )
@@ -1,11 +1,24 @@
 from django.contrib import admin
 from rooms.models import Player, Room
+from rooms.tokens import revoke_tokens
 
 
 @admin.register(Player)
 class PlayerAdmin(admin.ModelAdmin):
     """Admin model for Players."""
 
+    actions = ["revoke_tokens"]
+
+    def revoke_tokens(self, request, queryset):
+        """Revoke all tokens issued to the selected players up until now."""
+        revoked = 0
+        for player_id in queryset.values_list("id", flat=True):
+            revoke_tokens(player_id)
+            revoked += 1
+        self.message_user(request, "Revoked the tokens of {} players.".format(revoked))
+
+    revoke_tokens.short_description = "Revoke the tokens of the selected players"
+
 
 @admin.register(Room)
 class RoomAdmin(admin.ModelAdmin):
@@ -1,34 +1,140 @@
 from asgiref.sync import async_to_sync
+from channels.consumer import AsyncConsumer
+from channels.db import database_sync_to_async
 from channels.generic.websocket import SyncConsumer
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 import json
 from rooms.services import get_player_from_cookie
-from .models import Player
+from .heartbeat import heartbeat
+from .models import Player, queue_group_events
+from games.instrumentation import instrumentation
+from games.metrics import metrics
+from games.profiling import profiler
 from games.services import decode_message
 
 
-class RoomConsumer(SyncConsumer):
+def execute_player_message(message, player):
+    """
+    Execute a message send by a player.
+
+    :param message: the decoded message
+    :param player: the Player that sent the message
+    :return: the text to send back to the player, None if nothing has to be send back
+    """
+    if "game" in message.keys() and message["game"] and player.room.game is not None:
+        return player.room.game.execute_message(message, player)
+    elif "type" in message.keys():
+        if message["type"] == "ping":
+            player.interaction()
+            return get_pong_message(player)
+    return None
+
+
+def get_message_key(message) -> str:
+    """
+    Get the type of a message as used for instrumentation, metrics and profiling.
+
+    :param message: the decoded message
+    :return: the phase and type of game messages joined by a slash (for example "phase1/answer"), the type otherwise
+    """
+    if message.get("game"):
+        return "{}/{}".format(message.get("phase"), message.get("type"))
+    return str(message.get("type"))
+
+
+def get_pong_message(player):
+    """
+    Get the answer to a heartbeat of a player.
+
+    :param player: the Player that sent the heartbeat
+    :return: the text of the pong message with the state version of the room of the player and the suggested
+    heartbeat interval in milliseconds
+    """
+    version = player.room.state_version if player.room is not None else None
+    return json.dumps({"type": "pong", "version": version, "interval": int(heartbeat.interval * 1000)})
+
+
+def get_refresh_message(room):
+    """
+    Get a message making all players in a room refresh.
+
+    :param room: the Room to refresh
+    :return: the text of the refresh message with the state version of the room
+    """
+    return json.dumps({"type": "refresh", "version": room.state_version})
+
+
+def get_fragments_message(fragments, player):
+    """
+    Get the message with the page fragments for a player.
+
+    :param fragments: the shared fragments of a group message, a dictionary mapping container ids to html
+    :param player: the Player receiving the fragments
+    :return: the text of the fragments message including the fragments rendered for this player
+    """
+    fragments = dict(fragments)
+    if player is not None and player.room is not None:
+        game = player.room.game
+        if game is not None and hasattr(game, "render_player_fragments"):
+            fragments.update(game.render_player_fragments(player))
+    version = player.room.state_version if player is not None and player.room is not None else None
+    return json.dumps({"type": "fragments", "fragments": fragments, "version": version})
+
+
+class PlayerContextMixin:
+    """
+    Player context of a room websocket.
+
+    The player, its room and the roster of the room are resolved once and kept until a room_changed event is received.
+    The game of the room is reloaded on every use so that it includes the moves of other players.
+    """
+
+    player = None
+
+    def get_player(self):
+        """
+        Get the player of this connection.
+
+        :return: the Player object with its room, None if the cookie does not belong to a player
+        """
+        if self.player is None:
+            player_id_cookie = self.scope["cookies"].get(Player.PLAYER_COOKIE_NAME, None)
+            self.player = get_player_from_cookie(player_id_cookie)
+        elif self.player.room is not None:
+            self.player.room.refresh_game()
+        return self.player
+
+    def clear_player(self):
+        """Drop the player context so that it is resolved again on next use."""
+        self.player = None
+
+
+class RoomConsumer(PlayerContextMixin, SyncConsumer):
     """Room consumer."""
 
+    connected = False
+
     def websocket_connect(self, event):
         """Connect websocket."""
         room_name = self.scope["url_route"]["kwargs"].get("room_name")
-        player_id_cookie = self.scope["cookies"].get(Player.PLAYER_COOKIE_NAME, None)
-        player = get_player_from_cookie(player_id_cookie)
+        player = self.get_player()
         if player is None or player.room is None or player.room.slug != room_name:
             self.disconnect_connection()
         else:
             player.interaction()
             self.add_to_group(player)
-            async_to_sync(self.channel_layer.group_send)(
-                player.room.slug, {"type": "send_group_message", "text": json.dumps({"type": "refresh"})},
-            )
+            player.room.send_group_message(get_refresh_message(player.room))
             self.accept_connection()
 
     def websocket_disconnect(self, code):
         """Disconnect websocket."""
-        player_id_cookie = self.scope["cookies"].get("player_id", None)
-        player = get_player_from_cookie(player_id_cookie)
-        player.interaction()
+        if self.connected:
+            self.connected = False
+            heartbeat.disconnect()
+        player = self.get_player()
+        if player is not None:
+            player.interaction(flush=True)
 
     def add_to_group(self, player):
         """Add a player to the correct group."""
@@ -40,29 +146,38 @@ class RoomConsumer(SyncConsumer):
 
     def websocket_receive(self, event):
         """Receive websocket."""
-        player_id_cookie = self.scope["cookies"].get("player_id", None)
-        player = get_player_from_cookie(player_id_cookie)
         message = decode_message(event)
-        self.execute_message(message, player)
+        key = get_message_key(message)
+        metrics.count("websocket_messages", key)
+        with instrumentation.measure(key), profiler.profile("message/{}".format(key)):
+            player = self.get_player()
+            if player is None:
+                return
+            self.execute_message(message, player)
 
     def execute_message(self, message, player):
         """Execute a message send by a player."""
-        if "game" in message.keys() and message["game"] and player.room.game is not None:
-            send_back = player.room.game.execute_message(message, player)
-            if send_back:
-                self.send({"type": "websocket.send", "text": send_back})
-        elif "type" in message.keys():
-            if message["type"] == "ping":
-                player.interaction()
-                self.send({"type": "websocket.send", "text": json.dumps({"type": "refresh"})})
+        send_back = execute_player_message(message, player)
+        if send_back:
+            self.send({"type": "websocket.send", "text": send_back})
 
     def send_group_message(self, event):
         """Send a group message."""
         self.send({"type": "websocket.send", "text": event["text"]})
 
+    def send_group_fragments(self, event):
+        """Send the fragments of a group message together with the fragments for the player of this connection."""
+        self.send({"type": "websocket.send", "text": get_fragments_message(event["fragments"], self.get_player())})
+
+    def room_changed(self, event):
+        """Drop the player context when players joined or left the room or its game changed."""
+        self.clear_player()
+
     def accept_connection(self):
         """Accept the connection."""
         self.send({"type": "websocket.accept"})
+        self.connected = True
+        heartbeat.connect()
 
     def disconnect_connection(self):
         """Disconnect the connection."""
@@ -77,3 +192,154 @@ class RoomConsumer(SyncConsumer):
         """Send an error message."""
         response = {"type": "error", "message": error_msg}
         self.send({"type": "websocket.send", "text": json.dumps(response)})
+
+
+class AsyncRoomConsumer(PlayerContextMixin, AsyncConsumer):
+    """
+    Room consumer running on the event loop.
+
+    Database access is done in the database thread pool, channel layer calls are awaited directly.
+    """
+
+    connected = False
+
+    async def websocket_connect(self, event):
+        """Connect websocket."""
+        room_name = self.scope["url_route"]["kwargs"].get("room_name")
+        refresh_message = await self.connect_player(room_name)
+        if refresh_message is None:
+            await self.disconnect_connection()
+        else:
+            await self.channel_layer.group_add(room_name, self.channel_name)
+            with metrics.timer("group_send"):
+                await self.channel_layer.group_send(room_name, {"type": "send_group_message", "text": refresh_message})
+            await self.accept_connection()
+
+    async def websocket_disconnect(self, code):
+        """Disconnect websocket."""
+        if self.connected:
+            self.connected = False
+            heartbeat.disconnect()
+        await self.disconnect_player()
+
+    async def websocket_receive(self, event):
+        """Receive websocket."""
+        message = decode_message(event)
+        metrics.count("websocket_messages", get_message_key(message))
+        send_back, events = await self.execute_message(message)
+        await self.send_group_events(events)
+        if send_back:
+            await self.send({"type": "websocket.send", "text": send_back})
+
+    @database_sync_to_async
+    def connect_player(self, room_name):
+        """
+        Get the connecting player and register its interaction.
+
+        :param room_name: the slug of the room the player connects to
+        :return: the refresh message for the room, None if the player may not connect to this room
+        """
+        player = self.get_player()
+        if player is None or player.room is None or player.room.slug != room_name:
+            return None
+        player.interaction()
+        return get_refresh_message(player.room)
+
+    @database_sync_to_async
+    def disconnect_player(self):
+        """Register the interaction of a disconnecting player."""
+        player = self.get_player()
+        if player is not None:
+            player.interaction(flush=True)
+
+    @database_sync_to_async
+    def execute_message(self, message):
+        """
+        Execute a message send by the player of this connection.
+
+        Group events sent while executing the message are queued, so that they are sent on the event loop.
+        :param message: the decoded message
+        :return: a tuple (the text to send back to the player or None if nothing has to be send back, the queued group
+        events as tuples (group, event))
+        """
+        key = get_message_key(message)
+        with instrumentation.measure(key), profiler.profile("message/{}".format(key)), queue_group_events() as events:
+            player = self.get_player()
+            if player is None:
+                return None, events
+            return execute_player_message(message, player), events
+
+    async def send_group_events(self, events):
+        """
+        Send queued group events to the channel layer.
+
+        :param events: a list of tuples (group, event)
+        :return: None
+        """
+        for group, event in events:
+            with metrics.timer("group_send"):
+                await self.channel_layer.group_send(group, event)
+
+    @database_sync_to_async
+    def render_fragments_message(self, fragments):
+        """
+        Get the message with the page fragments for the player of this connection.
+
+        :param fragments: the shared fragments of a group message
+        :return: the text of the fragments message
+        """
+        return get_fragments_message(fragments, self.get_player())
+
+    async def send_group_message(self, event):
+        """Send a group message."""
+        await self.send({"type": "websocket.send", "text": event["text"]})
+
+    async def send_group_fragments(self, event):
+        """Send the fragments of a group message together with the fragments for the player of this connection."""
+        text = await self.render_fragments_message(event["fragments"])
+        await self.send({"type": "websocket.send", "text": text})
+
+    async def room_changed(self, event):
+        """Drop the player context when players joined or left the room or its game changed."""
+        self.clear_player()
+
+    async def accept_connection(self):
+        """Accept the connection."""
+        await self.send({"type": "websocket.accept"})
+        self.connected = True
+        heartbeat.connect()
+
+    async def disconnect_connection(self):
+        """Disconnect the connection."""
+        await self.send({"type": "websocket.disconnect"})
+
+    async def send_error_and_disconnect(self, error_msg="An error occurred"):
+        """Send an error message and disconnect."""
+        await self.send_error(error_msg=error_msg)
+        await self.send({"type": "websocket.disconnect"})
+
+    async def send_error(self, error_msg="An error occurred"):
+        """Send an error message."""
+        response = {"type": "error", "message": error_msg}
+        await self.send({"type": "websocket.send", "text": json.dumps(response)})
+
+
+ROOM_CONSUMERS = {
+    "sync": RoomConsumer,
+    "async": AsyncRoomConsumer,
+}
+
+
+def get_room_consumer():
+    """
+    Get the room consumer class configured with the ROOMS_CONSUMER setting.
+
+    :return: RoomConsumer for "sync", AsyncRoomConsumer for "async"
+    """
+    consumer = getattr(settings, "ROOMS_CONSUMER", "sync")
+    try:
+        return ROOM_CONSUMERS[consumer]
+    except KeyError:
+        raise ImproperlyConfigured(
+            "ROOMS_CONSUMER must be one of {}, not {}".format(", ".join(ROOM_CONSUMERS.keys()), consumer)
+        )
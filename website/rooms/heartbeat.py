@@ -0,0 +1,58 @@
+import math
+import threading
+
+from django.conf import settings
+
+
+class Heartbeat:
+    """
+    Process-local heartbeat settings for room websockets.
+
+    The connected websockets of this process are counted so that the suggested heartbeat interval grows under load.
+    """
+
+    def __init__(self, interval: float = 5, max_interval: float = 30, connections_per_interval: int = 200):
+        """
+        Initialize a Heartbeat object.
+
+        :param interval: the heartbeat interval in seconds when the process is not under load
+        :param max_interval: the maximum heartbeat interval in seconds, should stay below the time players go offline
+        :param connections_per_interval: the amount of connections after which the interval is increased by interval
+        """
+        self.base_interval = interval
+        self.max_interval = max_interval
+        self.connections_per_interval = connections_per_interval
+        self._connections = 0
+        self._lock = threading.Lock()
+
+    @property
+    def connections(self) -> int:
+        """Get the amount of connected websockets."""
+        return self._connections
+
+    def connect(self):
+        """Register a connected websocket."""
+        with self._lock:
+            self._connections += 1
+
+    def disconnect(self):
+        """Register a disconnected websocket."""
+        with self._lock:
+            self._connections = max(0, self._connections - 1)
+
+    @property
+    def interval(self) -> float:
+        """
+        Get the suggested heartbeat interval.
+
+        :return: the interval in seconds, a multiple of the base interval depending on the amount of connections
+        """
+        factor = max(1, math.ceil(self._connections / self.connections_per_interval))
+        return min(self.max_interval, self.base_interval * factor)
+
+
+heartbeat = Heartbeat(
+    interval=getattr(settings, "ROOMS_HEARTBEAT_INTERVAL", 5),
+    max_interval=getattr(settings, "ROOMS_HEARTBEAT_MAX_INTERVAL", 30),
+    connections_per_interval=getattr(settings, "ROOMS_HEARTBEAT_CONNECTIONS", 200),
+)
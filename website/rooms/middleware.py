@@ -0,0 +1,25 @@
+from .models import Player
+from .tokens import is_legacy_token, is_revoked
+
+
+class PlayerTokenMiddleware:
+    """Replace legacy player cookies with signed player tokens."""
+
+    def __init__(self, get_response):
+        """Initialize PlayerTokenMiddleware."""
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """
+        Set a signed token on responses to requests with a legacy player cookie of a player that was not revoked.
+
+        :param request: the request
+        :return: the response
+        """
+        response = self.get_response(request)
+        token = request.COOKIES.get(Player.PLAYER_COOKIE_NAME, None)
+        if token is not None and is_legacy_token(token) and Player.PLAYER_COOKIE_NAME not in response.cookies:
+            player = Player.objects.filter(cookie=token).first()
+            if player is not None and not is_revoked(player.id):
+                response.set_cookie(Player.PLAYER_COOKIE_NAME, player.get_token())
+        return response
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-18 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rooms', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['content_type', 'object_id'], name='rooms_room_content_81c079_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-18 08:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rooms', '0002_room_game_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='player',
+            name='cookie',
+            field=models.CharField(db_index=True, max_length=64),
+        ),
+    ]
@@ -1,19 +1,61 @@
+import hashlib
 import json
 import secrets
+import threading
+from contextlib import contextmanager
 
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from django.contrib.auth import get_user_model
 from django.db import models
 from django.urls import reverse
-from django.utils import timezone
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.utils.text import slugify
+from games.instrumentation import instrumentation
+from games.metrics import metrics
 from games.utils import games
+from .presence import presence
+from .tokens import create_token
 
 User = get_user_model()
 
+_queued_events = threading.local()
+
+
+@contextmanager
+def queue_group_events():
+    """
+    Queue the group events sent in this thread instead of sending them to the channel layer.
+
+    :return: a context manager yielding the list the events are queued in as tuples (group, event)
+    """
+    previous = getattr(_queued_events, "events", None)
+    events = list()
+    _queued_events.events = events
+    try:
+        yield events
+    finally:
+        _queued_events.events = previous
+
+
+def group_send(group: str, event: dict):
+    """
+    Send an event to a group, measuring the time spent in the channel layer.
+
+    The event is queued instead if queue_group_events is active in this thread.
+    :param group: the name of the group
+    :param event: the event to send
+    :return: None
+    """
+    events = getattr(_queued_events, "events", None)
+    if events is not None:
+        events.append((group, event))
+        return
+    channel_layer = get_channel_layer()
+    with instrumentation.timer("send"), metrics.timer("group_send"):
+        async_to_sync(channel_layer.group_send)(group, event)
+
 
 class RoomStateException(Exception):
     """Exception for room state."""
@@ -33,6 +75,31 @@ class InvalidAmountOfPlayersException(Exception):
     pass
 
 
+class GameForeignKey(GenericForeignKey):
+    """
+    Generic foreign key from a room to its game.
+
+    Games that implement cache_room(room) are handed the room they were resolved from, so that they do not have to
+    look up their room again. When the game of a room is replaced, the room is removed from the old game.
+    """
+
+    def __get__(self, instance, cls=None):
+        """Get the game of a room and cache the room in the game."""
+        game = super().__get__(instance, cls)
+        if instance is not None and game is not None and hasattr(game, "cache_room"):
+            game.cache_room(instance)
+        return game
+
+    def __set__(self, instance, value):
+        """Set the game of a room and update the cached room of the old and new game."""
+        old_game = self.get_cached_value(instance, default=None)
+        if old_game is not None and old_game is not value and hasattr(old_game, "cache_room"):
+            old_game.cache_room(None)
+        super().__set__(instance, value)
+        if value is not None and hasattr(value, "cache_room"):
+            value.cache_room(instance)
+
+
 class Room(models.Model):
     """Room model."""
 
@@ -40,7 +107,24 @@ class Room(models.Model):
     slug = models.SlugField(null=False, blank=False, unique=True, max_length=256)
     content_type = models.ForeignKey(ContentType, on_delete=models.SET_NULL, null=True, blank=True)
     object_id = models.PositiveIntegerField(blank=True, null=True)
-    game = GenericForeignKey("content_type", "object_id")
+    game = GameForeignKey("content_type", "object_id")
+
+    class Meta:
+        """Meta class for Room."""
+
+        indexes = [models.Index(fields=["content_type", "object_id"])]
+
+    def __init__(self, *args, **kwargs):
+        """
+        Initialize Room object.
+
+        The roster of players is loaded on first access and kept until refresh_players is called.
+        :param args: arguments
+        :param kwargs: keyword arguments
+        """
+        super().__init__(*args, **kwargs)
+        self._players = None
+        self._player_positions = None
 
     def __str__(self) -> str:
         """Cast this object to a string."""
@@ -53,10 +137,56 @@ class Room(models.Model):
                 print("Redirecting group")
                 self.redirect_group(reverse("rooms:redirect"))
 
+    def _load_players(self):
+        """Load the roster snapshot of this room if it is not loaded yet."""
+        if self._players is None:
+            self._players = list(Player.objects.filter(room=self).order_by("cookie"))
+            self._player_positions = {player.id: index for index, player in enumerate(self._players)}
+
+    @property
+    def players(self) -> list:
+        """Get an ordered snapshot of all players in this room, use refresh_players to reload it."""
+        self._load_players()
+        return self._players
+
+    def player_position(self, player):
+        """
+        Get the position of a player in the roster of this room.
+
+        :param player: the Player to get the position of
+        :return: the index of the player in the players list, None if the player is not in this room
+        """
+        self._load_players()
+        return self._player_positions.get(player.id)
+
     @property
-    def players(self):
-        """Get all players in this room."""
-        return Player.objects.filter(room=self).order_by("cookie")
+    def state_version(self) -> str:
+        """
+        Get the version of the state shown to the players in this room.
+
+        The version changes when players join or leave, go on- or offline, or when the game in this room is altered.
+        :return: a short hexadecimal digest of the state
+        """
+        game = self.game
+        state = [self.content_type_id, self.object_id, getattr(game, "version", None)]
+        state += [(player.id, player.online) for player in self.players]
+        return hashlib.sha1(repr(state).encode()).hexdigest()[:16]
+
+    def refresh_players(self):
+        """Drop the roster snapshot of this room so that it is reloaded on next access."""
+        self._players = None
+        self._player_positions = None
+
+    def refresh_game(self):
+        """Drop the cached game of this room so that it is reloaded on next access."""
+        game_field = type(self).game
+        if game_field.is_cached(self):
+            game_field.delete_cached_value(self)
+
+    def refresh_from_db(self, *args, **kwargs):
+        """Reload this room from the database, including the roster."""
+        super().refresh_from_db(*args, **kwargs)
+        self.refresh_players()
 
     def save(self, *args, **kwargs):
         """
@@ -73,15 +203,41 @@ class Room(models.Model):
                 return ValueError("A slug for this game already exists, please choose another name")
             self.slug = new_slug
         super(Room, self).save(*args, **kwargs)
+        self.send_room_changed()
 
     def redirect_group(self, route):
         """Redirect this room to a new page."""
         self.send_group_message(json.dumps({"type": "redirect", "url": route}))
 
+    def group_send(self, event):
+        """
+        Send an event to the group of this room, see group_send.
+
+        :param event: the event to send
+        :return: None
+        """
+        group_send(self.slug, event)
+
+    def send_room_changed(self):
+        """Notify the connections to this room that its players or its game changed."""
+        self.group_send({"type": "room_changed"})
+
     def send_group_message(self, message):
         """Send a group message to this room."""
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(self.slug, {"type": "send_group_message", "text": message})
+        self.group_send({"type": "send_group_message", "text": message})
+
+    def send_group_fragments(self):
+        """
+        Send the page fragments of the game in this room to all players in this room.
+
+        The shared fragments are rendered once, the consumer of every player adds the fragments for that player. Games
+        that do not render fragments make the players refresh instead.
+        """
+        game = self.game
+        if game is None or not hasattr(game, "render_shared_fragments"):
+            self.send_group_message(json.dumps({"type": "refresh"}))
+            return
+        self.group_send({"type": "send_group_fragments", "fragments": game.render_shared_fragments()})
 
     def start_game(self, game):
         """
@@ -94,7 +250,7 @@ class Room(models.Model):
             if game in games.get_games().keys():
                 if (
                     games.get_games()[game].minimum_amount_of_players()
-                    <= self.players.count()
+                    <= len(self.players)
                     <= games.get_games()[game].maximum_amount_of_players()
                 ):
                     new_game = games.get_games()[game].objects.create()
@@ -115,7 +271,7 @@ class Player(models.Model):
 
     PLAYER_COOKIE_NAME = "player_id"
 
-    cookie = models.CharField(max_length=64)
+    cookie = models.CharField(max_length=64, db_index=True)
     name = models.CharField(max_length=32, blank=False, null=False)
     room = models.ForeignKey(Room, on_delete=models.SET_NULL, null=True, blank=False, default=None)
     last_interaction = models.DateTimeField(auto_now_add=True)
@@ -123,17 +279,27 @@ class Player(models.Model):
     @property
     def online(self):
         """Check if a player is online."""
-        return self.last_interaction >= timezone.now() - timezone.timedelta(minutes=1)
+        return presence.is_online(self.get_last_interaction())
+
+    def get_last_interaction(self):
+        """
+        Get the last interaction of this player.
+
+        :return: the last interaction registered in the presence store or the database, whichever is later
+        """
+        last_interaction = presence.last_interaction(self.id)
+        if last_interaction is None or last_interaction < self.last_interaction:
+            return self.last_interaction
+        return last_interaction
 
     def __init__(self, *args, **kwargs):
         """Initialise class."""
         super().__init__(*args, **kwargs)
-        self._room = self.room
+        self._room_id = self.room_id
 
-    def notify_room(self):
-        """Notify this room."""
-        if self._room is not None:
-            self._room.remove_player(self)
+    def notify_room(self, room):
+        """Notify a room this player leaves."""
+        room.remove_player(self)
 
     def save(self, *args, **kwargs):
         """
@@ -144,9 +310,17 @@ class Player(models.Model):
         :return: None
         """
         # Check if changes have been done to the room itself
-        if self._room != self.room:
-            self.notify_room()
+        room_changed = self._room_id != self.room_id
+        old_room = Room.objects.filter(pk=self._room_id).first() if room_changed else None
+        if old_room is not None:
+            self.notify_room(old_room)
         super(Player, self).save(*args, **kwargs)
+        if room_changed:
+            for room in (old_room, self.room):
+                if room is not None:
+                    room.refresh_players()
+                    room.send_room_changed()
+            self._room_id = self.room_id
 
     def __str__(self):
         """Convert this object to a string."""
@@ -160,9 +334,16 @@ class Player(models.Model):
         """
         return self.room is not None
 
-    def interaction(self, save=True):
-        """Update last interaction of player."""
-        self.last_interaction = timezone.now()
+    def interaction(self, save=False, flush=False):
+        """
+        Update last interaction of player.
+
+        The interaction is registered in the presence store, which writes it to the database in batches.
+        :param save: whether to also save this player immediately
+        :param flush: whether to write the interaction to the database immediately, for example when disconnecting
+        :return: None
+        """
+        self.last_interaction = presence.touch(self.id, flush=flush)
         if save:
             self.save()
 
@@ -175,11 +356,19 @@ class Player(models.Model):
         return {
             "name": self.name,
             "online": self.online,
-            "last_interaction": self.last_interaction.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "last_interaction": self.get_last_interaction().strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
             "room": self.room.__str__(),
             "cookie": self.cookie,
         }
 
+    def get_token(self) -> str:
+        """
+        Get a signed token identifying this player.
+
+        :return: the token to store in the player cookie
+        """
+        return create_token(self)
+
     @staticmethod
     def get_new_player(name):
         """
@@ -0,0 +1,126 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+
+class PresenceStore:
+    """
+    Process-local store of the last interactions of players.
+
+    Interactions are kept in memory and written to the last_interaction field of players in one batched query every
+    flush interval by a background thread, started at the first interaction in a process, and at exit. Entries that are
+    flushed and older than the timeout are dropped. The database lags at most flush interval seconds behind, so
+    the flush interval plus the maximum heartbeat interval must stay well below the timeout for other processes to see
+    connected players as online.
+    """
+
+    def __init__(self, timeout: float = 60, flush_interval: float = 10):
+        """
+        Initialize a PresenceStore object.
+
+        :param timeout: the amount of seconds after their last interaction that players are considered online
+        :param flush_interval: the amount of seconds between two flushes to the database
+        """
+        self.timeout = timeout
+        self.flush_interval = flush_interval
+        self._interactions = dict()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def touch(self, player_id, moment=None, flush=False):
+        """
+        Register an interaction of a player.
+
+        :param player_id: the id of the player
+        :param moment: the time of the interaction, defaults to now
+        :param flush: whether to write the interaction of this player to the database immediately
+        :return: the time of the interaction
+        """
+        moment = timezone.now() if moment is None else moment
+        if self._thread is None:
+            self.start()
+        with self._lock:
+            self._interactions[player_id] = moment
+            self._pending.add(player_id)
+        if flush:
+            self.flush(player_ids=[player_id])
+        return moment
+
+    def start(self):
+        """Start flushing pending interactions every flush interval in a background thread and at exit."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self.run, name="presence-flush", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def run(self):
+        """Flush pending interactions every flush interval, run by the background thread."""
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logging.exception("Could not flush the last interactions of players")
+            finally:
+                connection.close()
+
+    def last_interaction(self, player_id):
+        """
+        Get the last interaction of a player registered in this process.
+
+        :param player_id: the id of the player
+        :return: the time of the last interaction, None if the player did not interact since it was last dropped
+        """
+        return self._interactions.get(player_id)
+
+    def is_online(self, last_interaction) -> bool:
+        """
+        Check if a last interaction is within the timeout.
+
+        :param last_interaction: the time of the last interaction
+        :return: True if the last interaction was less than timeout seconds ago, False otherwise
+        """
+        return last_interaction >= timezone.now() - timezone.timedelta(seconds=self.timeout)
+
+    def flush(self, player_ids=None) -> int:
+        """
+        Write pending interactions to the database in one query.
+
+        :param player_ids: the ids of the players to write the pending interactions of, None for all players
+        :return: the amount of players that were updated
+        """
+        from .models import Player
+
+        with self._lock:
+            flushed = self._pending if player_ids is None else self._pending.intersection(player_ids)
+            pending = [Player(id=player_id, last_interaction=self._interactions[player_id]) for player_id in flushed]
+            self._pending = self._pending.difference(flushed)
+            if player_ids is None:
+                expired = timezone.now() - timezone.timedelta(seconds=self.timeout)
+                self._interactions = {
+                    player_id: moment for player_id, moment in self._interactions.items() if moment >= expired
+                }
+
+        if len(pending) > 0:
+            try:
+                Player.objects.bulk_update(pending, ["last_interaction"])
+            except Exception:
+                with self._lock:
+                    self._pending.update(player.id for player in pending if player.id in self._interactions)
+                raise
+            logging.debug("Flushed the last interaction of {} players".format(len(pending)))
+        return len(pending)
+
+
+presence = PresenceStore(
+    timeout=getattr(settings, "ROOMS_PRESENCE_TIMEOUT", 60),
+    flush_interval=getattr(settings, "ROOMS_PRESENCE_FLUSH_INTERVAL", 10),
+)
@@ -3,5 +3,5 @@ from django.conf.urls import url
 from . import consumers
 
 websocket_urlpatterns = [
-    url(r"rooms/(?P<room_name>\w+)/$", consumers.RoomConsumer),
+    url(r"rooms/(?P<room_name>\w+)/$", consumers.get_room_consumer()),
 ]
@@ -1,4 +1,13 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils import timezone
+
+from games.services import delete_in_batches
 from .models import Player, Room
+from .presence import presence
+from .tokens import is_legacy_token, is_revoked, read_token
+
+DATA_MINIMISATION_BATCH_SIZE = 1000
 
 
 def get_player_from_request(request):
@@ -14,50 +23,92 @@ def get_player_from_request(request):
 
 def get_player_from_cookie(player_id: str):
     """
-    Get a player from the player id.
+    Get a player from the player cookie.
 
-    :param player_id: the player id
-    :return: a Player object if the player id matches, None otherwise
+    :param player_id: the signed player token or a legacy cookie token
+    :return: a Player object with its room if the token is valid and the player exists, None otherwise
     """
-    if player_id is not None:
-        try:
-            player = Player.objects.get(cookie=player_id)
-            return player
-        except Player.DoesNotExist:
+    if player_id is None:
+        return None
+
+    players = Player.objects.select_related("room")
+    if is_legacy_token(player_id):
+        player = players.filter(cookie=player_id).first()
+        if player is None or is_revoked(player.id):
             return None
+        return player
+
+    player_pk = read_token(player_id)
+    if player_pk is None:
+        return None
+    return players.filter(pk=player_pk).first()
+
+
+def get_offline_cutoff():
+    """
+    Get the time after which players must have interacted to be online.
+
+    The processes serving players write their interactions to the database every ROOMS_PRESENCE_FLUSH_INTERVAL seconds
+    and when players disconnect, so connected players interacted after the cutoff.
+    :return: the cutoff time
+    """
+    return timezone.now() - timezone.timedelta(seconds=presence.timeout)
+
 
-    return None
+def get_rooms_by_phase() -> list:
+    """
+    Count the rooms per game and game phase.
+
+    Games without a phase field are counted under phase None, rooms without a game under game None.
+    :return: a list of tuples (app label of the game, phase, amount of rooms)
+    """
+    counts = list()
+    for row in Room.objects.values("content_type").annotate(count=Count("id")).order_by("content_type"):
+        if row["content_type"] is None:
+            counts.append((None, None, row["count"]))
+            continue
+        content_type = ContentType.objects.get_for_id(row["content_type"])
+        model = content_type.model_class()
+        if model is None or "phase" not in [field.name for field in model._meta.get_fields()]:
+            counts.append((content_type.app_label, None, row["count"]))
+            continue
+        games = model.objects.filter(
+            id__in=Room.objects.filter(content_type=content_type, object_id__isnull=False).values("object_id")
+        )
+        for phase in games.values("phase").annotate(count=Count("id")).order_by("phase"):
+            counts.append((content_type.app_label, phase["phase"], phase["count"]))
+    return counts
+
+
+def get_data_minimisation_querysets(cutoff):
+    """
+    Get the rooms and players removed by data minimisation.
+
+    :param cutoff: the time after which players must have interacted to be online
+    :return: a tuple (rooms without online players, offline players without a room or in such a room)
+    """
+    online_players = Player.objects.filter(room=OuterRef("pk"), last_interaction__gte=cutoff)
+    rooms = Room.objects.filter(~Exists(online_players))
+    players = Player.objects.filter(last_interaction__lt=cutoff).filter(
+        Q(room__isnull=True) | Q(room__in=rooms.values("pk"))
+    )
+    return rooms, players
 
 
-def execute_data_minimisation(dry_run=False):
+def execute_data_minimisation(dry_run=False, batch_size=DATA_MINIMISATION_BATCH_SIZE, limit=None):
     """
     Remove all players that are offline and all rooms that only have offline players.
 
-    :param dry_run: does not really remove data if True
-    :return: list of objects removed
-    """
-    deleted_rooms = list()
-    deleted_players = list()
-
-    rooms = Room.objects.all()
-    for room in rooms:
-        delete = True
-        for player in room.players:
-            if player.online:
-                delete = False
-        if delete:
-            deleted_rooms.append(room)
-
-    players = Player.objects.all()
-    players_in_deleted_rooms = Player.objects.filter(room__in=deleted_rooms)
-    for player in players:
-        if not player.online and (player.room is None or player in players_in_deleted_rooms):
-            deleted_players.append(player)
-
-    if not dry_run:
-        for room in deleted_rooms:
-            room.delete()
-        for player in deleted_players:
-            player.delete()
-
-    return [deleted_rooms] + [deleted_players]
+    :param dry_run: does not really remove data if True, only counts the objects that would be removed
+    :param batch_size: the maximum amount of objects removed per query
+    :param limit: the maximum amount of rooms and the maximum amount of players to remove, None to remove all
+    :return: a dictionary with the amount of rooms and players removed
+    """
+    rooms, players = get_data_minimisation_querysets(get_offline_cutoff())
+    if dry_run:
+        return {"rooms": rooms.count(), "players": players.count()}
+
+    # Rooms go first, players of removed rooms are then removed as players without a room
+    deleted_rooms = delete_in_batches(rooms, batch_size=batch_size, limit=limit)
+    deleted_players = delete_in_batches(players, batch_size=batch_size, limit=limit)
+    return {"rooms": deleted_rooms, "players": deleted_players}
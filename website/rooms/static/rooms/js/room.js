@@ -4,6 +4,8 @@ if (window.location.protocol === 'https:') {
 }
 
 let alive_timer = null;
+let heartbeat_interval = 5000;
+let state_version = typeof STATE_VERSION !== 'undefined' ? STATE_VERSION : null;
 
 let endpoint = wsStart + window.location.host + '/rooms/' + ROOM_SLUG + '/';
 let socket = null;
@@ -12,6 +14,12 @@ function ping_alive() {
     socket.send(JSON.stringify({"type": "ping"}));
 }
 
+function set_state_version(version) {
+    if (typeof version !== 'undefined') {
+        state_version = version;
+    }
+}
+
 function handle_event(event) {
     /* Execute game event handler */
     if (typeof handle_game_event !== 'undefined') {
@@ -23,6 +31,20 @@ function handle_event(event) {
     if (data.type !== null) {
         if (data.type === 'refresh') {
             update_update_list();
+            set_state_version(data.version);
+        }
+        else if (data.type === 'fragments') {
+            replace_fragments(data.fragments);
+            set_state_version(data.version);
+        }
+        else if (data.type === 'pong') {
+            if (data.interval) {
+                heartbeat_interval = data.interval;
+            }
+            if (data.version !== state_version) {
+                update_update_list();
+                set_state_version(data.version);
+            }
         }
         else if (data.type === "message") {
             if (data.color === "red") {
@@ -70,7 +92,7 @@ function reconnect_socket() {
     else {
         ping_alive();
     }
-    alive_timer = setTimeout(reconnect_socket, 5000);
+    alive_timer = setTimeout(reconnect_socket, heartbeat_interval);
 }
 
 function kick_player(player_id) {
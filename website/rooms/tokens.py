@@ -0,0 +1,90 @@
+"""
+Signed player tokens.
+
+The player cookie holds a token signed with the secret key that carries the id of the player and the time it was
+issued, so that the player can be identified without looking up the token. Legacy cookies hold the random cookie token
+of a player and are replaced with a signed token by PlayerTokenMiddleware. All tokens of a player can be revoked by
+adding the player to a deny-list kept in the ROOMS_TOKEN_CACHE cache, which must be shared by all processes, and
+replacing its legacy cookie token. Tokens are revoked with the revoketokens command or the player admin.
+"""
+import secrets
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+
+TOKEN_SALT = "rooms.player"
+TOKEN_SEPARATOR = ":"
+
+REVOKED_KEY = "rooms:player-token-revoked:{}"
+
+
+def get_deny_list():
+    """Get the cache holding the deny-list of player tokens."""
+    return caches[getattr(settings, "ROOMS_TOKEN_CACHE", "default")]
+
+
+def create_token(player) -> str:
+    """
+    Create a signed token for a player.
+
+    The token does not carry the room of the player, as a player keeps its cookie while joining and leaving rooms. The
+    room is looked up with the player instead.
+    :param player: the Player to create the token for
+    :return: the signed token
+    """
+    return signing.dumps({"p": player.id, "t": int(time.time())}, salt=TOKEN_SALT)
+
+
+def is_legacy_token(token: str) -> bool:
+    """
+    Check if a token is a legacy cookie token.
+
+    :param token: the token
+    :return: True if the token is not signed, False otherwise
+    """
+    return TOKEN_SEPARATOR not in token
+
+
+def read_token(token: str):
+    """
+    Read the player id from a signed token.
+
+    :param token: the signed token
+    :return: the id of the player, None if the signature is invalid or the token was revoked
+    """
+    try:
+        payload = signing.loads(token, salt=TOKEN_SALT)
+    except signing.BadSignature:
+        return None
+
+    if is_revoked(payload["p"], payload["t"]):
+        return None
+    return payload["p"]
+
+
+def is_revoked(player_id, issued=None) -> bool:
+    """
+    Check if a token of a player was revoked.
+
+    :param player_id: the id of the player
+    :param issued: the time the token was issued, None for legacy cookie tokens which are revoked by any revocation
+    :return: True if the token was revoked, False otherwise
+    """
+    revoked = get_deny_list().get(REVOKED_KEY.format(player_id))
+    return revoked is not None and (issued is None or issued <= revoked)
+
+
+def revoke_tokens(player_id):
+    """
+    Revoke all tokens issued to a player up until now.
+
+    The legacy cookie token of the player is replaced as well, so that it can not be exchanged for a new token.
+    :param player_id: the id of the player
+    :return: None
+    """
+    from .models import Player
+
+    get_deny_list().set(REVOKED_KEY.format(player_id), int(time.time()), timeout=None)
+    Player.objects.filter(pk=player_id).update(cookie=secrets.token_hex(32))
@@ -2,6 +2,7 @@ from django.http import Http404, JsonResponse
 from django.shortcuts import render, redirect
 from django.template.loader import get_template
 from django.views.generic import TemplateView
+from games.profiling import ProfiledViewMixin
 from .forms import RoomCreationForm, PlayerCreationForm
 from .models import Room, Player, RoomStateException, InvalidAmountOfPlayersException
 from .services import get_player_from_request
@@ -85,7 +86,7 @@ class RoomView(TemplateView):
         return render(request, self.template_name, {"room": room})
 
 
-class RoomRefreshView(TemplateView):
+class RoomRefreshView(ProfiledViewMixin, TemplateView):
     """Refresh the Room view."""
 
     template_name = "rooms/room.html"
@@ -165,7 +166,7 @@ class CreateUserView(TemplateView):
                 player.name = form.cleaned_data.get("player_name")
                 player.save()
             redirect_with_cookie = redirect("rooms:redirect")
-            redirect_with_cookie.set_cookie(Player.PLAYER_COOKIE_NAME, player.cookie)
+            redirect_with_cookie.set_cookie(Player.PLAYER_COOKIE_NAME, player.get_token())
             return redirect_with_cookie
         else:
             return render(request, self.template_name, {"form": form})